@@ -1,7 +1,135 @@
+import csv
+import io
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from db.database import BookingDatabase
+from app.resources import get_db
+
+# Number of booking cards rendered per page
+PAGE_SIZE = 25
+
+# Search results rendered at most; a narrower term finds the rest
+SEARCH_LIMIT = 50
+
+
+@st.cache_data(ttl=30)
+def _load_stats(version, today):
+    """Aggregated dashboard statistics, computed in SQL"""
+    return get_db().get_stats(today)
+
+
+@st.cache_data(ttl=60)
+def _count_bookings(version, status=None, booking_type=None, date=None):
+    """Count bookings matching the filters"""
+    return get_db().count_bookings(status, booking_type, date)
+
+
+@st.cache_data(ttl=60)
+def _filter_options(version):
+    """Selectbox options for the status, type and date filters (dates newest first)"""
+    options = get_db().get_filter_options()
+    return options['status'], options['booking_type'], options['date'][::-1]
+
+
+@st.cache_data(ttl=60)
+def _load_page(version, limit, offset, status=None, booking_type=None, date=None):
+    """Fetch one page of filtered bookings"""
+    return get_db().query_bookings(status, booking_type, date, limit=limit, offset=offset)
+
+
+def _bookings_to_csv(bookings):
+    """Serialize a list of booking dicts to CSV text"""
+    buffer = io.StringIO()
+    if bookings:
+        writer = csv.DictWriter(buffer, fieldnames=list(bookings[0].keys()))
+        writer.writeheader()
+        writer.writerows(bookings)
+    return buffer.getvalue()
+
+
+def _pending_actions():
+    """Booking actions staged in this session: booking_id -> status or 'delete'"""
+    return st.session_state.setdefault("pending_actions", {})
+
+
+def _stage_action(booking_id, action):
+    """Button callback that stages an action until changes are applied"""
+    _pending_actions()[booking_id] = action
+
+
+def _apply_pending_actions(db):
+    """Flush all staged actions to the database in one transaction"""
+    pending = _pending_actions()
+    status_updates = {booking_id: action for booking_id, action in pending.items() if action != 'delete'}
+    delete_ids = [booking_id for booking_id, action in pending.items() if action == 'delete']
+    
+    changed = db.apply_bulk(status_updates, delete_ids)
+    pending.clear()
+    return changed
+
+
+@st.fragment
+def _render_booking_card(booking, bar_shown):
+    """One booking card; its buttons rerun only this fragment"""
+    pending = _pending_actions()
+    action = pending.get(booking['id'])
+    status = action if action in ('confirmed', 'cancelled') else booking['status']
+    
+    with st.expander(
+        f"🎫 Booking #{booking['id']} - {booking['name']} - {booking['date']} at {booking['time']}"
+    ):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown(f"**📝 Booking ID:** {booking['id']}")
+            st.markdown(f"**👤 Name:** {booking['name']}")
+            st.markdown(f"**📧 Email:** {booking['email']}")
+            st.markdown(f"**📱 Phone:** {booking['phone']}")
+        
+        with col2:
+            st.markdown(f"**🎯 Service:** {booking['booking_type']}")
+            st.markdown(f"**📅 Date:** {booking['date']}")
+            st.markdown(f"**⏰ Time:** {booking['time']}")
+            st.markdown(f"**✅ Status:** {booking['status'].upper()}")
+        
+        st.markdown(f"**🕐 Created:** {booking['created_at']}")
+        
+        if action:
+            st.caption(f"⏳ Pending: {action.upper()} (click 'Apply changes' to save)")
+        
+        # Action buttons stage changes; nothing is written until applied
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.button(
+                "✅ Confirm",
+                key=f"confirm_{booking['id']}",
+                disabled=(status == 'confirmed' and action != 'delete'),
+                on_click=_stage_action,
+                args=(booking['id'], 'confirmed')
+            )
+        
+        with col2:
+            st.button(
+                "❌ Cancel",
+                key=f"cancel_{booking['id']}",
+                disabled=(status == 'cancelled' and action != 'delete'),
+                on_click=_stage_action,
+                args=(booking['id'], 'cancelled')
+            )
+        
+        with col3:
+            st.button(
+                "🗑️ Delete",
+                key=f"delete_{booking['id']}",
+                disabled=(action == 'delete'),
+                on_click=_stage_action,
+                args=(booking['id'], 'delete')
+            )
+    
+    # The apply bar lives outside the fragment; rerun the page when it must appear or vanish
+    if bool(pending) != bar_shown:
+        st.rerun()
 
 
 def show_admin_dashboard():
@@ -9,8 +137,8 @@ def show_admin_dashboard():
     st.title("📊 Admin Dashboard")
     st.markdown("### Manage All Bookings")
     
-    # Initialize database
-    db = BookingDatabase()
+    # Shared database handle
+    db = get_db()
     
     # Create tabs for different views
     tab1, tab2, tab3 = st.tabs(["📋 All Bookings", "🔍 Search", "📈 Statistics"])
@@ -28,118 +156,113 @@ def show_admin_dashboard():
 def show_all_bookings(db):
     """Display all bookings in a table"""
     try:
-        # Fetch all bookings
-        bookings = db.get_all_bookings()
+        # Process-wide write counter: any session's write, chat bookings
+        # included, moves every cached query below onto a fresh key
+        version = db.write_version
+        total = _count_bookings(version)
         
-        if not bookings:
+        if not total:
             st.info("📭 No bookings found yet.")
             return
         
-        # Convert to DataFrame for better display
-        df = pd.DataFrame(bookings)
-        
         # Display total count
-        st.metric("Total Bookings", len(bookings))
+        st.metric("Total Bookings", total)
         
         # Add filters
+        statuses, booking_types, dates = _filter_options(version)
         col1, col2, col3 = st.columns(3)
         
         with col1:
             status_filter = st.selectbox(
                 "Filter by Status",
-                ["All"] + list(df['status'].unique()),
+                ["All"] + statuses,
                 key="status_filter"
             )
         
         with col2:
             booking_type_filter = st.selectbox(
                 "Filter by Type",
-                ["All"] + list(df['booking_type'].unique()),
+                ["All"] + booking_types,
                 key="type_filter"
             )
         
         with col3:
             date_filter = st.selectbox(
                 "Filter by Date",
-                ["All"] + sorted(df['date'].unique(), reverse=True),
+                ["All"] + dates,
                 key="date_filter"
             )
         
-        # Apply filters
-        filtered_df = df.copy()
+        # Filters are applied in SQL; "All" means no filter
+        filters = {
+            'status': None if status_filter == "All" else status_filter,
+            'booking_type': None if booking_type_filter == "All" else booking_type_filter,
+            'date': None if date_filter == "All" else date_filter,
+        }
         
-        if status_filter != "All":
-            filtered_df = filtered_df[filtered_df['status'] == status_filter]
+        filtered_total = _count_bookings(version, **filters)
+        total_pages = max(1, -(-filtered_total // PAGE_SIZE))
         
-        if booking_type_filter != "All":
-            filtered_df = filtered_df[filtered_df['booking_type'] == booking_type_filter]
+        # Keep the page in range when the filters shrink the result set
+        if st.session_state.get("bookings_page", 1) > total_pages:
+            st.session_state["bookings_page"] = total_pages
         
-        if date_filter != "All":
-            filtered_df = filtered_df[filtered_df['date'] == date_filter]
+        page = st.number_input(
+            f"Page (of {total_pages})",
+            min_value=1,
+            max_value=total_pages,
+            step=1,
+            key="bookings_page"
+        )
+        
+        page_rows = _load_page(version, PAGE_SIZE, (page - 1) * PAGE_SIZE, **filters)
         
         # Display filtered results
-        st.markdown(f"**Showing {len(filtered_df)} of {len(bookings)} bookings**")
-        
-        # Display bookings as cards
-        for idx, booking in filtered_df.iterrows():
-            with st.expander(
-                f"🎫 Booking #{booking['id']} - {booking['name']} - {booking['date']} at {booking['time']}"
-            ):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown(f"**📝 Booking ID:** {booking['id']}")
-                    st.markdown(f"**👤 Name:** {booking['name']}")
-                    st.markdown(f"**📧 Email:** {booking['email']}")
-                    st.markdown(f"**📱 Phone:** {booking['phone']}")
-                
-                with col2:
-                    st.markdown(f"**🎯 Service:** {booking['booking_type']}")
-                    st.markdown(f"**📅 Date:** {booking['date']}")
-                    st.markdown(f"**⏰ Time:** {booking['time']}")
-                    st.markdown(f"**✅ Status:** {booking['status'].upper()}")
-                
-                st.markdown(f"**🕐 Created:** {booking['created_at']}")
-                
-                # Action buttons
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    if st.button(
-                        "✅ Confirm",
-                        key=f"confirm_{booking['id']}",
-                        disabled=(booking['status'] == 'confirmed')
-                    ):
-                        if db.update_booking_status(booking['id'], 'confirmed'):
-                            st.success("Booking confirmed!")
-                            st.rerun()
-                
-                with col2:
-                    if st.button(
-                        "❌ Cancel",
-                        key=f"cancel_{booking['id']}",
-                        disabled=(booking['status'] == 'cancelled')
-                    ):
-                        if db.update_booking_status(booking['id'], 'cancelled'):
-                            st.warning("Booking cancelled!")
-                            st.rerun()
-                
-                with col3:
-                    if st.button("🗑️ Delete", key=f"delete_{booking['id']}"):
-                        if db.delete_booking(booking['id']):
-                            st.error("Booking deleted!")
-                            st.rerun()
-        
-        # Export option
+        st.markdown(f"**Showing {len(page_rows)} of {filtered_total} matching bookings ({total} total)**")
+        
+        # Staged changes are applied together in one transaction
+        pending = _pending_actions()
+        if pending:
+            col1, col2, col3 = st.columns([2, 1, 1])
+            
+            with col1:
+                st.info("⏳ You have pending changes")
+            
+            with col2:
+                if st.button("✅ Apply changes", use_container_width=True):
+                    changed = _apply_pending_actions(db)
+                    st.toast(f"Applied {changed} change(s)")
+                    st.rerun()
+            
+            with col3:
+                st.button("↩️ Discard", on_click=pending.clear, use_container_width=True)
+        
+        # Display bookings as cards; each card reruns on its own
+        for booking in page_rows:
+            _render_booking_card(booking, bool(pending))
+        
+        # Export options
         st.markdown("---")
-        if st.button("📥 Export to CSV"):
-            csv = filtered_df.to_csv(index=False)
-            st.download_button(
-                label="Download CSV",
-                data=csv,
-                file_name=f"bookings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if st.button("📥 Export to CSV"):
+                st.download_button(
+                    label="Download CSV",
+                    data=_bookings_to_csv(db.query_bookings(**filters)),
+                    file_name=f"bookings_{stamp}.csv",
+                    mime="text/csv"
+                )
+        
+        with col2:
+            if st.button("📥 Export to JSON"):
+                st.download_button(
+                    label="Download JSON",
+                    data=db.query_bookings_json(**filters),
+                    file_name=f"bookings_{stamp}.json",
+                    mime="application/json"
+                )
     
     except Exception as e:
         st.error(f"Error loading bookings: {str(e)}")
@@ -152,18 +275,24 @@ def show_search_bookings(db):
     search_term = st.text_input(
         "Search by name, email, or date",
         placeholder="Enter search term...",
+        help="Matches the start of words: 'jo' finds John, 'gmail' finds @gmail.com addresses",
         key="search_input"
     )
     
     if search_term:
         try:
-            results = db.search_bookings(search_term)
+            # One extra row tells us whether there are more than we show
+            results = db.search_bookings(search_term, limit=SEARCH_LIMIT + 1)
             
             if not results:
                 st.warning(f"No bookings found matching '{search_term}'")
                 return
             
-            st.success(f"Found {len(results)} booking(s)")
+            if len(results) > SEARCH_LIMIT:
+                results = results[:SEARCH_LIMIT]
+                st.success(f"Showing the first {SEARCH_LIMIT} bookings; refine the search to narrow them down")
+            else:
+                st.success(f"Found {len(results)} booking(s)")
             
             # Display results
             for booking in results:
@@ -198,31 +327,27 @@ def show_statistics(db):
     st.markdown("### 📈 Booking Statistics")
     
     try:
-        bookings = db.get_all_bookings()
+        today = datetime.now().strftime('%Y-%m-%d')
+        stats = _load_stats(db.write_version, today)
         
-        if not bookings:
+        if not stats['total']:
             st.info("No data available for statistics")
             return
         
-        df = pd.DataFrame(bookings)
-        
         # Overview metrics
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Total Bookings", len(df))
+            st.metric("Total Bookings", stats['total'])
         
         with col2:
-            confirmed = len(df[df['status'] == 'confirmed'])
-            st.metric("Confirmed", confirmed)
+            st.metric("Confirmed", stats['by_status'].get('confirmed', 0))
         
         with col3:
-            cancelled = len(df[df['status'] == 'cancelled'])
-            st.metric("Cancelled", cancelled)
+            st.metric("Cancelled", stats['by_status'].get('cancelled', 0))
         
         with col4:
-            unique_customers = df['email'].nunique()
-            st.metric("Unique Customers", unique_customers)
+            st.metric("Unique Customers", stats['unique_customers'])
         
         st.markdown("---")
         
@@ -231,30 +356,23 @@ def show_statistics(db):
         
         with col1:
             st.markdown("#### Bookings by Service Type")
-            type_counts = df['booking_type'].value_counts()
-            st.bar_chart(type_counts)
+            st.bar_chart(pd.Series(stats['by_type'], name='count'))
         
         with col2:
             st.markdown("#### Bookings by Status")
-            status_counts = df['status'].value_counts()
-            st.bar_chart(status_counts)
+            st.bar_chart(pd.Series(stats['by_status'], name='count'))
         
         # Recent bookings
         st.markdown("---")
         st.markdown("#### 📅 Recent Bookings (Last 5)")
-        recent = df.head(5)[['id', 'name', 'booking_type', 'date', 'time', 'status']]
-        st.dataframe(recent, use_container_width=True, hide_index=True)
+        st.dataframe(stats['recent'], use_container_width=True, hide_index=True)
         
         # Upcoming bookings
         st.markdown("---")
         st.markdown("#### 🔜 Upcoming Bookings")
         
-        today = datetime.now().strftime('%Y-%m-%d')
-        upcoming = df[df['date'] >= today].sort_values('date')
-        
-        if len(upcoming) > 0:
-            upcoming_display = upcoming[['id', 'name', 'booking_type', 'date', 'time']]
-            st.dataframe(upcoming_display, use_container_width=True, hide_index=True)
+        if stats['upcoming']:
+            st.dataframe(stats['upcoming'], use_container_width=True, hide_index=True)
         else:
             st.info("No upcoming bookings")
     
@@ -1,51 +1,158 @@
-import os
+import functools
 import re
 import streamlit as st
 from datetime import datetime, timedelta
-from langchain_groq import ChatGroq
+from types import MappingProxyType
+from groq import APIError
 from langchain_core.messages import HumanMessage, SystemMessage
-from db.database import BookingDatabase
+from app.resources import get_db
+from app.config import EMAIL_RE
+from app.llm import get_llm
 from app.tools import send_booking_email
 
 
+# Compiled once at import; reused on every booking turn
+_PHONE_STRIP_RE = re.compile(r'[\s\-\(\)\+]')
+_WORD_RE = re.compile(r'[a-z]+')
+# One scan for every structured field; date precedes phone so ISO dates aren't read as digits
+_FIELDS_FIND_RE = re.compile(
+    r'\b(?P<email>[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})\b'
+    r'|\b(?P<date>\d{4}-\d{2}-\d{2})\b'
+    r'|\b(?P<time>\d{1,2}:\d{2})\b'
+    r'|\b(?P<phone>\d{10,15})\b',
+    re.ASCII
+)
+
+_SERVICE_PRICING = MappingProxyType({
+    'Doctor Appointment': {'price': 100, 'icon': '🏥', 'message': 'Your health is our priority!'},
+    'Salon Service': {'price': 50, 'icon': '💇', 'message': 'Get ready to look fabulous!'},
+    'Hotel Reservation': {'price': 150, 'icon': '🏨', 'message': 'Enjoy your comfortable stay!'},
+    'Event Booking': {'price': 200, 'icon': '🎉', 'message': "Let's make your event memorable!"},
+    'Fitness Class': {'price': 30, 'icon': '💪', 'message': 'Time to get fit and healthy!'},
+    'Restaurant Reservation': {'price': 0, 'icon': '🍽️', 'message': 'Bon appétit! Enjoy your meal!'},
+    'Travel Booking': {'price': 500, 'icon': '✈️', 'message': 'Have an amazing journey!'},
+    'Spa Treatment': {'price': 120, 'icon': '🧖', 'message': 'Relax and rejuvenate!'},
+    'Consultation': {'price': 80, 'icon': '📋', 'message': 'We look forward to helping you!'}
+})
+
+# Display price per service, formatted once
+_PRICING_STR = MappingProxyType({
+    service: (f"${info['price']}" if info['price'] > 0 else "Free")
+    for service, info in _SERVICE_PRICING.items()
+})
+
+# The services menu never changes, so the whole question is rendered once
+_SERVICE_QUESTION = (
+    "What service would you like?\n\n**Available Services:**\n"
+    + "".join(
+        f"{info['icon']} **{service}** - {_PRICING_STR[service]}\n"
+        for service, info in _SERVICE_PRICING.items()
+    )
+    + "\n💡 *Type the service name (e.g., 'Doctor', 'Salon')*"
+)
+
+_SERVICE_KEYWORDS = MappingProxyType({
+    'Doctor Appointment': ('doctor', 'medical', 'physician', 'healthcare', 'clinic', 'checkup', 'consultation', 'appointment'),
+    'Salon Service': ('salon', 'haircut', 'hair', 'beauty', 'manicure', 'pedicure', 'styling'),
+    'Hotel Reservation': ('hotel', 'room', 'accommodation', 'stay', 'resort', 'lodge'),
+    'Event Booking': ('event', 'party', 'celebration', 'wedding', 'conference', 'meeting'),
+    'Fitness Class': ('fitness', 'gym', 'workout', 'exercise', 'yoga', 'training', 'class'),
+    'Restaurant Reservation': ('restaurant', 'dining', 'dinner', 'lunch', 'table', 'food', 'eat'),
+    'Travel Booking': ('travel', 'trip', 'tour', 'vacation', 'flight', 'ticket', 'journey'),
+    'Spa Treatment': ('spa', 'massage', 'treatment', 'therapy', 'relaxation', 'wellness'),
+    'Consultation': ('consult', 'advice', 'guidance', 'counseling')
+})
+
+# Confirmation replies
+_YES_WORDS = frozenset({'yes', 'confirm', 'correct', 'ok', 'okay', 'sure', 'yep', 'yeah', 'confirmed'})
+_NO_WORDS = frozenset({'no', 'cancel', 'stop', 'restart', 'nope', 'cancelled'})
+
+_EMOJI_MAP = MappingProxyType({
+    'name': '👤',
+    'email': '📧',
+    'phone': '📱',
+    'booking_type': '🎯',
+    'date': '📅',
+    'time': '⏰',
+    'pricing': '💰'
+})
+
+# keyword -> (priority, service); services listed first win, as in the old linear scan
+_KEYWORD_SERVICE = {}
+for _rank, (_service, _keywords) in enumerate(_SERVICE_KEYWORDS.items()):
+    for _keyword in _keywords:
+        _KEYWORD_SERVICE.setdefault(_keyword, (_rank, _service))
+
+# Zero-width lookahead reports overlapping keywords in a single pass; at any
+# position the alternation tries higher-priority services first
+_SERVICE_KEYWORD_RE = re.compile(
+    '(?=(' + '|'.join(re.escape(keyword) for keyword in _KEYWORD_SERVICE) + '))'
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _is_valid_email(email):
+    """Memoized email check; users often resend the same address"""
+    return bool(EMAIL_RE.match(email))
+
+
+@functools.lru_cache(maxsize=1024)
+def _normalize_phone(phone):
+    """Strip spaces, dashes, parentheses and '+' from a phone number"""
+    return _PHONE_STRIP_RE.sub('', phone)
+
+
+def _parse_date(date_str):
+    """Parse YYYY-MM-DD without strptime's format interpretation"""
+    year, month, day = date_str.split('-')
+    return datetime(int(year), int(month), int(day))
+
+
+# Short, low-temperature replies for field extraction
+_EXTRACTION_LLM_SETTINGS = {'temperature': 0.3, 'max_tokens': 150}
+
+
+@functools.lru_cache(maxsize=512)
+def _llm_extract(text, field):
+    """Ask the LLM for a field value; memoized on (text, field) so retried messages skip the call"""
+    if field == 'booking_type':
+        prompt = f"""Extract service type from: "{text}"
+Available: {', '.join(_SERVICE_PRICING.keys())}
+Reply with ONLY the exact service name or "NOT_FOUND".
+Service:"""
+    else:
+        prompt = f"""Extract {field} from: "{text}"
+Reply ONLY the value or "NOT_FOUND".
+{field}:"""
+    
+    messages = [
+        SystemMessage(content="You are a data extraction assistant."),
+        HumanMessage(content=prompt)
+    ]
+    
+    response = get_llm(**_EXTRACTION_LLM_SETTINGS).invoke(messages)
+    result = response.content.strip().strip('"').strip("'")
+    
+    if result and result != 'NOT_FOUND' and len(result) < 100:
+        return result
+    return None
+
+
 class BookingFlow:
     """Complete booking flow with pricing and service-specific messages"""
     
+    # Service types with pricing
+    service_pricing = _SERVICE_PRICING
+    
     def __init__(self, chat_logic):
         self.chat_logic = chat_logic
-        self.db = BookingDatabase()
+        self.db = get_db()
         self.llm = self._initialize_llm()
         self.required_fields = ['name', 'email', 'phone', 'booking_type', 'date', 'time']
-        
-        # Service types with pricing
-        self.service_pricing = {
-            'Doctor Appointment': {'price': 100, 'icon': '🏥', 'message': 'Your health is our priority!'},
-            'Salon Service': {'price': 50, 'icon': '💇', 'message': 'Get ready to look fabulous!'},
-            'Hotel Reservation': {'price': 150, 'icon': '🏨', 'message': 'Enjoy your comfortable stay!'},
-            'Event Booking': {'price': 200, 'icon': '🎉', 'message': "Let's make your event memorable!"},
-            'Fitness Class': {'price': 30, 'icon': '💪', 'message': 'Time to get fit and healthy!'},
-            'Restaurant Reservation': {'price': 0, 'icon': '🍽️', 'message': 'Bon appétit! Enjoy your meal!'},
-            'Travel Booking': {'price': 500, 'icon': '✈️', 'message': 'Have an amazing journey!'},
-            'Spa Treatment': {'price': 120, 'icon': '🧖', 'message': 'Relax and rejuvenate!'},
-            'Consultation': {'price': 80, 'icon': '📋', 'message': 'We look forward to helping you!'}
-        }
     
     def _initialize_llm(self):
         try:
-            if hasattr(st, 'secrets') and 'GROQ_API_KEY' in st.secrets:
-                api_key = st.secrets["GROQ_API_KEY"]
-            else:
-                api_key = os.getenv("GROQ_API_KEY", "")
-            
-            if not api_key:
-                raise ValueError("GROQ_API_KEY not found")
-            
-            return ChatGroq(
-                api_key=api_key,
-                model="llama-3.3-70b-versatile",
-                temperature=0.3,
-                max_tokens=150,
-            )
+            return get_llm(**_EXTRACTION_LLM_SETTINGS)
         except Exception as e:
             st.error(f"Failed to initialize LLM: {str(e)}")
             raise
@@ -68,12 +175,7 @@ class BookingFlow:
         
         # Auto-fill pricing when booking_type is selected
         if 'booking_type' in booking_data and 'pricing' not in booking_data:
-            service_info = self.service_pricing.get(booking_data['booking_type'], {})
-            price = service_info.get('price', 0)
-            if price > 0:
-                booking_data['pricing'] = f"${price}"
-            else:
-                booking_data['pricing'] = "Free"
+            booking_data['pricing'] = _PRICING_STR.get(booking_data['booking_type'], "Free")
         
         missing_fields = [field for field in self.required_fields 
                          if field not in booking_data or not booking_data[field]]
@@ -88,21 +190,26 @@ class BookingFlow:
     def _validate_extracted_data(self, extracted_data, existing_data):
         errors = {}
         
+        # One clock read per validation
+        now = datetime.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        booking_date = None
+        
         if 'email' in extracted_data:
             email = extracted_data['email']
-            if not re.match(r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}$', email):
+            if not _is_valid_email(email):
                 errors['email'] = f"'{email}' is not valid. Use format: name@example.com"
         
         if 'phone' in extracted_data:
-            phone = re.sub(r'[\s\-\(\)\+]', '', extracted_data['phone'])
+            phone = _normalize_phone(extracted_data['phone'])
             if not phone.isdigit() or len(phone) < 10 or len(phone) > 15:
                 errors['phone'] = f"'{extracted_data['phone']}' is not valid. Provide 10-15 digits"
         
-        if 'date' in extracted_data:
+        # A date already accepted earlier in this booking needs no second check
+        if 'date' in extracted_data and extracted_data['date'] != existing_data.get('date'):
             date_str = extracted_data['date']
             try:
-                booking_date = datetime.strptime(date_str, '%Y-%m-%d')
-                today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+                booking_date = _parse_date(date_str)
                 
                 if booking_date < today:
                     days_past = (today - booking_date).days
@@ -132,17 +239,14 @@ class BookingFlow:
                         # Reformat to ensure HH:MM
                         extracted_data['time'] = f"{hours:02d}:{mins:02d}"
                         
-                        booking_time = datetime.strptime(extracted_data['time'], '%H:%M')
-                        
                         if 'date' in extracted_data or 'date' in existing_data:
-                            date_str = extracted_data.get('date') or existing_data.get('date')
                             try:
-                                booking_date = datetime.strptime(date_str, '%Y-%m-%d')
-                                today = datetime.now().date()
+                                # Reuse the date parsed above when it came in this turn
+                                if booking_date is None:
+                                    booking_date = _parse_date(extracted_data.get('date') or existing_data.get('date'))
                                 
-                                if booking_date.date() == today:
-                                    current_time = datetime.now().time()
-                                    if booking_time.time() < current_time:
+                                if booking_date == today:
+                                    if now.replace(hour=hours, minute=mins, second=0, microsecond=0) < now:
                                         errors['time'] = f"'{extracted_data['time']}' has passed. Choose a future time"
                             except:
                                 pass
@@ -164,27 +268,15 @@ class BookingFlow:
     def _extract_booking_info(self, user_message, existing_data):
         extracted = {}
         
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        emails = re.findall(email_pattern, user_message)
-        if emails and 'email' not in existing_data:
-            extracted['email'] = emails[0]
-        
-        phone_pattern = r'\b\d{10,15}\b'
-        phones = re.findall(phone_pattern, user_message)
-        if phones and 'phone' not in existing_data:
-            extracted['phone'] = phones[0]
-        
-        date_pattern = r'\b\d{4}-\d{2}-\d{2}\b'
-        dates = re.findall(date_pattern, user_message)
-        if dates and 'date' not in existing_data:
-            extracted['date'] = dates[0]
+        for match in _FIELDS_FIND_RE.finditer(user_message):
+            field = match.lastgroup
+            if field not in existing_data and field not in extracted:
+                extracted[field] = match.group(field)
         
-        # Improved time extraction - handle both H:MM and HH:MM
-        time_pattern = r'\b\d{1,2}:\d{2}\b'
-        times = re.findall(time_pattern, user_message)
-        if times and 'time' not in existing_data:
-            time_parts = times[0].split(':')
-            extracted['time'] = f"{int(time_parts[0]):02d}:{time_parts[1]}"
+        # Normalize H:MM to HH:MM
+        if 'time' in extracted:
+            hours, minutes = extracted['time'].split(':')
+            extracted['time'] = f"{int(hours):02d}:{minutes}"
         
         if 'name' not in existing_data and len(user_message.split()) <= 5:
             clean_msg = user_message.strip()
@@ -204,48 +296,34 @@ class BookingFlow:
     def _extract_booking_type(self, text):
         text_lower = text.lower().strip()
         
-        service_keywords = {
-            'Doctor Appointment': ['doctor', 'medical', 'physician', 'healthcare', 'clinic', 'checkup', 'consultation', 'appointment'],
-            'Salon Service': ['salon', 'haircut', 'hair', 'beauty', 'manicure', 'pedicure', 'styling'],
-            'Hotel Reservation': ['hotel', 'room', 'accommodation', 'stay', 'resort', 'lodge'],
-            'Event Booking': ['event', 'party', 'celebration', 'wedding', 'conference', 'meeting'],
-            'Fitness Class': ['fitness', 'gym', 'workout', 'exercise', 'yoga', 'training', 'class'],
-            'Restaurant Reservation': ['restaurant', 'dining', 'dinner', 'lunch', 'table', 'food', 'eat'],
-            'Travel Booking': ['travel', 'trip', 'tour', 'vacation', 'flight', 'ticket', 'journey'],
-            'Spa Treatment': ['spa', 'massage', 'treatment', 'therapy', 'relaxation', 'wellness'],
-            'Consultation': ['consult', 'advice', 'guidance', 'counseling']
-        }
-        
-        for service_type, keywords in service_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
-                return service_type
-        
-        return self._extract_with_llm(text, 'booking_type')
+        # One scan finds every keyword occurrence; keep the highest-priority service
+        best = None
+        for match in _SERVICE_KEYWORD_RE.finditer(text_lower):
+            rank, service_type = _KEYWORD_SERVICE[match.group(1)]
+            if best is None or rank < best[0]:
+                best = (rank, service_type)
+                if rank == 0:
+                    break
+        
+        if best:
+            return best[1]
+        
+        # Email, phone, date and time turns never name a service
+        if '@' in text_lower or len(text_lower) < 3 or any(ch.isdigit() for ch in text_lower):
+            return None
+        
+        # Normalized text keys the LLM cache so case/whitespace variants share a result
+        return self._extract_with_llm(text_lower, 'booking_type')
     
     def _extract_with_llm(self, text, field):
-        try:
-            if field == 'booking_type':
-                prompt = f"""Extract service type from: "{text}"
-Available: {', '.join(self.service_pricing.keys())}
-Reply with ONLY the exact service name or "NOT_FOUND".
-Service:"""
-            else:
-                prompt = f"""Extract {field} from: "{text}"
-Reply ONLY the value or "NOT_FOUND".
-{field}:"""
-            
-            messages = [
-                SystemMessage(content="You are a data extraction assistant."),
-                HumanMessage(content=prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
-            result = response.content.strip().strip('"').strip("'")
-            
-            if result and result != 'NOT_FOUND' and len(result) < 100:
-                return result
+        # Too little text to name a service; skip the network round trip
+        if len(text.split()) < 2 or text.isnumeric():
             return None
-        except:
+        
+        try:
+            return _llm_extract(text, field)
+        except APIError:
+            # Network or API failure; carry on without the suggestion
             return None
     
     def _ask_for_missing_info(self, missing_fields, booking_data):
@@ -265,17 +343,7 @@ Reply ONLY the value or "NOT_FOUND".
             for f in collected:
                 field_name = f.replace('_', ' ').title()
                 value = booking_data[f]
-                
-                emoji_map = {
-                    'name': '👤',
-                    'email': '📧',
-                    'phone': '📱',
-                    'booking_type': '🎯',
-                    'date': '📅',
-                    'time': '⏰',
-                    'pricing': '💰'
-                }
-                emoji = emoji_map.get(f, '•')
+                emoji = _EMOJI_MAP.get(f, '•')
                 summary += f"{emoji} {field_name}: **{value}**\n"
             summary += "\n"
         else:
@@ -288,11 +356,7 @@ Reply ONLY the value or "NOT_FOUND".
         elif field == 'phone':
             question = "What's your phone number?\n📱 *Example: 9876543210*"
         elif field == 'booking_type':
-            question = "What service would you like?\n\n**Available Services:**\n"
-            for service, info in self.service_pricing.items():
-                price_str = f"${info['price']}" if info['price'] > 0 else "Free"
-                question += f"{info['icon']} **{service}** - {price_str}\n"
-            question += "\n💡 *Type the service name (e.g., 'Doctor', 'Salon')*"
+            question = _SERVICE_QUESTION
         elif field == 'date':
             today = datetime.now()
             tomorrow = today + timedelta(days=1)
@@ -350,14 +414,17 @@ Reply ONLY the value or "NOT_FOUND".
         return message
     
     def _handle_confirmation(self, user_message, booking_data):
-        user_lower = user_message.lower().strip()
+        # Whole-word matching: 'book' is not 'ok', 'know' is not 'no'
+        tokens = set(_WORD_RE.findall(user_message.lower()))
         
-        if any(word in user_lower for word in ['yes', 'confirm', 'correct', 'ok', 'okay', 'sure', 'yep', 'yeah']):
+        if tokens & _YES_WORDS:
             success, result = self._save_booking(booking_data)
             
             if success:
                 booking_id = result
-                email_sent = send_booking_email(booking_data, booking_id)
+                # Delivery finishes in the background; the sidebar shows how it went
+                email_job = send_booking_email(booking_data, booking_id)
+                st.session_state.email_job = (booking_data.get('email'), email_job) if email_job else None
                 
                 # Get service-specific message
                 service_type = booking_data.get('booking_type', '')
@@ -373,8 +440,9 @@ Reply ONLY the value or "NOT_FOUND".
                 response += f"💰 **Total:** {booking_data.get('pricing')}\n\n"
                 response += f"━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
                 
-                if email_sent:
-                    response += f"✅ **Confirmation email sent to:**\n   {booking_data.get('email')}\n\n"
+                if email_job:
+                    response += f"📧 **Sending confirmation email to:**\n   {booking_data.get('email')}\n"
+                    response += "   *Delivery status is shown in the sidebar*\n\n"
                 else:
                     response += f"⚠️ *Email could not be sent, but booking is saved*\n\n"
                 
@@ -386,7 +454,7 @@ Reply ONLY the value or "NOT_FOUND".
             else:
                 return f"❌ Error: {result}\n\nPlease try again.", {}, False, True
         
-        elif any(word in user_lower for word in ['no', 'cancel', 'stop', 'restart', 'nope']):
+        elif tokens & _NO_WORDS:
             return "No problem! Let's start fresh. What service would you like to book?", {}, False, False
         
         else:
@@ -398,7 +466,7 @@ Reply ONLY the value or "NOT_FOUND".
                 if field not in booking_data or not booking_data[field]:
                     return False, f"Missing: {field}"
             
-            if not re.match(r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}$', booking_data['email']):
+            if not _is_valid_email(booking_data['email']):
                 return False, "Invalid email"
             
             try:
@@ -1,8 +1,162 @@
-import os
+import asyncio
+import re
+from collections import deque
+from itertools import islice
 import streamlit as st
-from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from app.config import MAX_MEMORY_MESSAGES
+from app.config import MAX_MEMORY_MESSAGES, RAG_MEMORY_MESSAGES
+from app.llm import get_llm
+
+
+# Phrase buckets in priority order: non-booking, widget selection, explicit booking
+_INTENT_PHRASES = (
+    (
+        'upload', 'uploaded', 'document', 'pdf', 'file',
+        'hi', 'hello', 'hey', 'good morning', 'good afternoon',
+        'how are you', 'what can you do', 'help',
+        'thank', 'thanks', 'bye', 'goodbye'
+    ),
+    ('use selected date', 'use selected time', 'selected date', 'selected time'),
+    (
+        'book a', 'make a booking', 'make an appointment',
+        'schedule a', 'reserve a', 'i want to book',
+        'i need to book', 'i would like to book',
+        'book appointment', 'make reservation',
+        'can i book', 'can i schedule'
+    ),
+)
+
+# phrase -> bucket rank
+_INTENT_PHRASE_RANK = {}
+for _rank, _phrases in enumerate(_INTENT_PHRASES):
+    for _phrase in _phrases:
+        _INTENT_PHRASE_RANK.setdefault(_phrase, _rank)
+
+# Zero-width lookahead so every start position is tried; alternatives are in
+# priority order, so a position reports its highest-priority phrase. Plain
+# substring semantics, as before ('hi' still matches inside 'this').
+_INTENT_PHRASE_RE = re.compile(
+    '(?=(' + '|'.join(re.escape(phrase) for phrase in _INTENT_PHRASE_RANK) + '))'
+)
+
+# Assistant turns that mean a booking question is waiting for an answer
+_BOOKING_QUESTION_RE = re.compile('|'.join(map(re.escape, (
+    'your name', 'your email', 'your phone', 'what date', 'what time',
+    'type of service', 'confirm your booking', 'is this correct'
+))))
+
+# Assistant turns that mean booking details are still being collected
+_BOOKING_PROGRESS_RE = re.compile('|'.join(map(re.escape, (
+    'information collected so far', 'your name?', 'your email', 'your phone',
+    'what date', 'what time', 'type of service', 'confirm your booking'
+))))
+
+# Substring matchers for canned replies and the RAG answer guard (no word
+# boundaries, matching the plain `in` checks they replace)
+_HALLUCINATION_RE = re.compile('|'.join(map(re.escape, (
+    'fake image', 'detection', 'ai-generated', 'e-commerce refund',
+    'binary classification', 'visual explanation'
+))))
+
+# Fixed general replies, keyed by bucket
+_CANNED = {
+    'start_booking': "Great! Let's start your booking. What's your name?",
+    'upload_prompt': "Perfect! Please use the file uploader in the sidebar to upload your PDF documents. 📄",
+    'affirmative': "Great! What would you like to do? I can help you with questions about our services or make a booking. Just say 'I want to book' to get started! 😊",
+    'negative': "No problem! Is there anything else I can help you with? Feel free to ask questions or say 'I want to book' if you'd like to make a booking later! 😊",
+    'greeting': (
+        "Hello! 👋 Welcome to our booking assistant. I'm here to help you!\n\n"
+        "I can:\n"
+        "• Answer questions about our services (upload PDFs first)\n"
+        "• Help you make bookings\n"
+        "• Provide information and assistance\n\n"
+        "What would you like to do today?"
+    ),
+    'thanks': "You're welcome! 😊 Is there anything else I can help you with?",
+    'goodbye': "Goodbye! Have a great day! Feel free to come back anytime you need help. 👋",
+    'upload': (
+        "Great! To upload documents:\n"
+        "1. Look for the 📄 file uploader in the sidebar\n"
+        "2. Select your PDF files\n"
+        "3. Click '📤 Process PDFs'\n"
+        "4. Then you can ask me questions about the content!\n\n"
+        "📋 Your PDFs should contain service info, pricing, hours, etc."
+    ),
+}
+
+_AFFIRMATIVE_REPLIES = frozenset({'yes', 'yeah', 'yep', 'sure', 'ok', 'okay'})
+
+# Whole-message replies
+_EXACT_REPLIES = {}
+for _text in ('no', 'nope', 'nah', 'not really'):
+    _EXACT_REPLIES[_text] = _CANNED['negative']
+for _text in ('hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening'):
+    _EXACT_REPLIES[_text] = _CANNED['greeting']
+
+# Substring replies, in priority order
+_CANNED_BUCKETS = ('thanks', 'goodbye', 'upload')
+_CANNED_KEYWORD_RANK = {
+    'thank': 0, 'thx': 0,
+    'bye': 1, 'see you': 1,
+    'upload': 2, 'document': 2, 'pdf': 2, 'file': 2,
+}
+_CANNED_KEYWORD_RE = re.compile(
+    '(?=(' + '|'.join(map(re.escape, _CANNED_KEYWORD_RANK)) + '))'
+)
+
+_RAG_SYSTEM_PROMPT = """You are a helpful booking assistant. Answer the user's question using ONLY the context provided from uploaded documents.
+
+CRITICAL RULES:
+1. ONLY use information from the context provided
+2. If the context is NOT relevant to the question, say: "I don't see information about that in the uploaded documents. Could you ask something else or upload more relevant PDFs?"
+3. If context seems unrelated to booking/services, say: "The uploaded document doesn't seem to contain service/booking information. Could you upload service brochures or menus?"
+4. DO NOT make up information
+5. DO NOT talk about topics unrelated to the user's services
+6. Keep answers focused on bookings and services
+7. Be concise and helpful"""
+
+_NO_CONTEXT_RESPONSE = "I couldn't find relevant information in the uploaded documents. Could you ask a more specific question? Or say 'I want to book' to make a booking!"
+
+_OFF_TOPIC_RESPONSE = (
+    "It looks like the uploaded PDF might not contain booking or service information. "
+    "Please upload PDFs with:\n"
+    "• Service descriptions\n"
+    "• Pricing\n"
+    "• Business hours\n"
+    "• Contact information\n\n"
+    "Or I can help you make a booking! Just say 'I want to book' 😊"
+)
+
+# Enough trailing text to catch an indicator split across streamed chunks
+_HALLUCINATION_TAIL = 32
+
+_GREETINGS_EXACT = frozenset({'hi', 'hello', 'hey'})
+_VAGUE_QUERIES = frozenset({'yes', 'no', 'ok', 'okay', 'sure', 'nope', 'yeah', 'yep'})
+
+
+def new_history():
+    """Empty conversation history, bounded to the last MAX_MEMORY_MESSAGES messages"""
+    return deque(maxlen=MAX_MEMORY_MESSAGES)
+
+
+def new_message(role, content):
+    """Chat message dict with its memory-context line and lowercase text computed once"""
+    return {
+        "role": role,
+        "content": content,
+        "_content_lower": content.lower(),
+        "_rendered": _render_message(role, content),
+    }
+
+
+def _content_lower(msg):
+    """Lowercase message text, precomputed by new_message when available"""
+    return msg['_content_lower'] if '_content_lower' in msg else msg['content'].lower()
+
+
+def _render_message(role, content):
+    """One line of memory context for a message"""
+    return f"{'User' if role == 'user' else 'Assistant'}: {content[:200]}"
 
 
 class ChatLogic:
@@ -15,20 +169,7 @@ class ChatLogic:
     def _initialize_llm(self):
         """Initialize the LLM model"""
         try:
-            if hasattr(st, 'secrets') and 'GROQ_API_KEY' in st.secrets:
-                api_key = st.secrets["GROQ_API_KEY"]
-            else:
-                api_key = os.getenv("GROQ_API_KEY", "")
-            
-            if not api_key:
-                raise ValueError("GROQ_API_KEY not found")
-            
-            return ChatGroq(
-                api_key=api_key,
-                model="llama-3.3-70b-versatile",
-                temperature=0.7,
-                max_tokens=2048,
-            )
+            return get_llm(temperature=0.7, max_tokens=2048)
         except Exception as e:
             st.error(f"Failed to initialize LLM: {str(e)}")
             raise
@@ -38,67 +179,42 @@ class ChatLogic:
         
         user_message_lower = user_message.lower().strip()
         
-        # Exclude phrases that are NOT booking intents
-        non_booking_phrases = [
-            'upload', 'uploaded', 'document', 'pdf', 'file',
-            'hi', 'hello', 'hey', 'good morning', 'good afternoon',
-            'how are you', 'what can you do', 'help',
-            'thank', 'thanks', 'bye', 'goodbye'
-        ]
+        # One scan over the message; keep the highest-priority bucket that matched
+        best = None
+        for match in _INTENT_PHRASE_RE.finditer(user_message_lower):
+            rank = _INTENT_PHRASE_RANK[match.group(1)]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
         
-        # Check if message is clearly NOT a booking intent
-        if any(phrase in user_message_lower for phrase in non_booking_phrases):
+        # Message is clearly NOT a booking intent
+        if best == 0:
             # Exception: if conversation context shows we're in booking flow
             if conversation_history:
                 recent_assistant_msg = None
-                for msg in reversed(conversation_history[-3:]):
+                for msg in islice(reversed(conversation_history), 3):
                     if msg['role'] == 'assistant':
-                        recent_assistant_msg = msg['content'].lower()
+                        recent_assistant_msg = _content_lower(msg)
                         break
                 
                 # If assistant just asked for booking info, continue booking flow
-                if recent_assistant_msg and any(q in recent_assistant_msg for q in 
-                    ['your name', 'your email', 'your phone', 'what date', 'what time', 
-                     'type of service', 'confirm your booking', 'is this correct']):
+                if recent_assistant_msg and _BOOKING_QUESTION_RE.search(recent_assistant_msg):
                     return 'booking'
             
             # Otherwise, it's a general/query intent
-            return 'query' if user_message_lower not in ['hi', 'hello', 'hey'] else 'general'
+            return 'query' if user_message_lower not in _GREETINGS_EXACT else 'general'
         
-        # Check for date/time widget usage
-        if any(phrase in user_message_lower for phrase in ['use selected date', 'use selected time', 'selected date', 'selected time']):
-            return 'booking'
-        
-        # Explicit booking keywords
-        booking_keywords = [
-            'book a', 'make a booking', 'make an appointment', 
-            'schedule a', 'reserve a', 'i want to book',
-            'i need to book', 'i would like to book',
-            'book appointment', 'make reservation',
-            'can i book', 'can i schedule'
-        ]
-        
-        # Check for explicit booking intent
-        if any(keyword in user_message_lower for keyword in booking_keywords):
+        # Date/time widget usage or explicit booking keywords
+        if best is not None:
             return 'booking'
         
         # Check conversation context for ongoing booking
         if conversation_history:
-            recent_messages = conversation_history[-3:]
-            for msg in recent_messages:
+            for msg in islice(reversed(conversation_history), 3):
                 if msg['role'] == 'assistant':
-                    content_lower = msg['content'].lower()
                     # Check if we're in the middle of collecting booking info
-                    if any(indicator in content_lower for indicator in [
-                        'information collected so far',
-                        'your name?',
-                        'your email',
-                        'your phone',
-                        'what date',
-                        'what time',
-                        'type of service',
-                        'confirm your booking'
-                    ]):
+                    if _BOOKING_PROGRESS_RE.search(_content_lower(msg)):
                         return 'booking'
         
         # Default to query
@@ -108,129 +224,270 @@ class ChatLogic:
         """Get response using RAG with relevance checking"""
         try:
             # Check if query is too vague for RAG
-            vague_queries = ['yes', 'no', 'ok', 'okay', 'sure', 'nope', 'yeah', 'yep']
-            if query.lower().strip() in vague_queries:
+            if query.lower().strip() in _VAGUE_QUERIES:
                 return self.get_general_response(query, conversation_history)
             
             context = self.rag_pipeline.query(query)
             
             if not context:
-                return "I couldn't find relevant information in the uploaded documents. Could you ask a more specific question? Or say 'I want to book' to make a booking!"
+                return _NO_CONTEXT_RESPONSE
             
-            memory_context = self._build_memory_context(conversation_history)
+            messages = self._build_rag_messages(query, context, conversation_history)
             
-            prompt = f"""You are a helpful booking assistant. Answer the user's question using ONLY the context provided from uploaded documents.
-
-Context from documents:
+            response = self.llm.invoke(messages)
+            return self._check_rag_result(response.content)
+            
+        except Exception as e:
+            return f"Sorry, I encountered an error: {str(e)}"
+    
+    def batch_respond(self, items):
+        """Answer several (query, conversation_history) pairs with one batched LLM call"""
+        responses = [None] * len(items)
+        pending = []
+        
+        for i, (query, conversation_history) in enumerate(items):
+            try:
+                if query.lower().strip() in _VAGUE_QUERIES:
+                    responses[i] = self.get_general_response(query, conversation_history)
+                    continue
+                
+                context = self.rag_pipeline.query(query)
+                if not context:
+                    responses[i] = _NO_CONTEXT_RESPONSE
+                    continue
+                
+                pending.append((i, self._build_rag_messages(query, context, conversation_history)))
+            except Exception as e:
+                responses[i] = f"Sorry, I encountered an error: {str(e)}"
+        
+        if pending:
+            results = self.llm.batch(
+                [messages for _, messages in pending],
+                config={"max_concurrency": 10},
+                return_exceptions=True
+            )
+            for (i, _), result in zip(pending, results):
+                if isinstance(result, Exception):
+                    responses[i] = f"Sorry, I encountered an error: {str(result)}"
+                else:
+                    responses[i] = self._check_rag_result(result.content)
+        
+        return responses
+    
+    def _build_rag_messages(self, query, context, conversation_history, memory_context=None):
+        """Assemble the RAG prompt messages for one query"""
+        if memory_context is None:
+            memory_context = self._build_memory_context(conversation_history, limit=RAG_MEMORY_MESSAGES)
+        
+        # Static instructions live in the system message; only per-turn data goes here
+        prompt = f"""Context from documents:
 {context}
 
-Conversation history:
+Recent conversation:
 {memory_context}
 
 User question: {query}
 
-CRITICAL RULES:
-1. ONLY use information from the context above
-2. If the context is NOT relevant to the question, say: "I don't see information about that in the uploaded documents. Could you ask something else or upload more relevant PDFs?"
-3. If context seems unrelated to booking/services, say: "The uploaded document doesn't seem to contain service/booking information. Could you upload service brochures or menus?"
-4. DO NOT make up information
-5. DO NOT talk about topics unrelated to the user's services
-6. Keep answers focused on bookings and services
-7. Be concise and helpful
-
 Answer:"""
+        
+        return [
+            SystemMessage(content=_RAG_SYSTEM_PROMPT),
+            HumanMessage(content=prompt)
+        ]
+    
+    def _check_rag_result(self, result):
+        """Replace answers that drift into unrelated topics with upload guidance"""
+        # Check if response seems to be hallucinating
+        if _HALLUCINATION_RE.search(result.lower()):
+            return _OFF_TOPIC_RESPONSE
+        
+        return result
+    
+    def get_general_response(self, user_message, conversation_history):
+        """Get general conversational response with better handling"""
+        try:
+            canned = self._canned_general_response(user_message, conversation_history)
+            if canned is not None:
+                return canned
             
-            messages = [
-                SystemMessage(content="You are a booking assistant. Only answer from provided context. Never make up information."),
-                HumanMessage(content=prompt)
-            ]
+            # General conversation
+            messages = self._build_general_messages(user_message, conversation_history)
             
             response = self.llm.invoke(messages)
-            result = response.content
+            return response.content
             
-            # Check if response seems to be hallucinating
-            hallucination_indicators = [
-                'fake image', 'detection', 'ai-generated', 'e-commerce refund',
-                'binary classification', 'visual explanation'
-            ]
+        except Exception as e:
+            return f"Sorry, I encountered an error: {str(e)}"
+    
+    def stream_rag_response(self, query, conversation_history):
+        """Yield the RAG answer chunk by chunk as the LLM produces it"""
+        try:
+            if query.lower().strip() in _VAGUE_QUERIES:
+                yield from self.stream_general_response(query, conversation_history)
+                return
             
-            if any(indicator in result.lower() for indicator in hallucination_indicators):
-                return (
-                    "It looks like the uploaded PDF might not contain booking or service information. "
-                    "Please upload PDFs with:\n"
-                    "• Service descriptions\n"
-                    "• Pricing\n"
-                    "• Business hours\n"
-                    "• Contact information\n\n"
-                    "Or I can help you make a booking! Just say 'I want to book' 😊"
-                )
+            context = self.rag_pipeline.query(query)
             
-            return result
+            if not context:
+                yield _NO_CONTEXT_RESPONSE
+                return
+            
+            messages = self._build_rag_messages(query, context, conversation_history)
+            
+            # Text already shown can't be retracted, so stop at the first
+            # off-topic indicator and append the upload guidance instead
+            tail = ""
+            for chunk in self.llm.stream(messages):
+                window = tail + chunk.content
+                if _HALLUCINATION_RE.search(window.lower()):
+                    yield "\n\n" + _OFF_TOPIC_RESPONSE
+                    return
+                tail = window[-_HALLUCINATION_TAIL:]
+                yield chunk.content
             
         except Exception as e:
-            return f"Sorry, I encountered an error: {str(e)}"
+            yield f"Sorry, I encountered an error: {str(e)}"
     
-    def get_general_response(self, user_message, conversation_history):
-        """Get general conversational response with better handling"""
+    def stream_general_response(self, user_message, conversation_history):
+        """Yield the general response chunk by chunk; canned replies come as one chunk"""
         try:
-            user_message_lower = user_message.lower().strip()
+            canned = self._canned_general_response(user_message, conversation_history)
+            if canned is not None:
+                yield canned
+                return
             
-            # Handle simple yes/no responses based on context
-            if user_message_lower in ['yes', 'yeah', 'yep', 'sure', 'ok', 'okay']:
-                # Check recent conversation
-                if conversation_history:
-                    last_bot_msg = None
-                    for msg in reversed(conversation_history[-3:]):
-                        if msg['role'] == 'assistant':
-                            last_bot_msg = msg['content'].lower()
-                            break
-                    
-                    if last_bot_msg:
-                        if 'want to book' in last_bot_msg or 'make a booking' in last_bot_msg:
-                            return "Great! Let's start your booking. What's your name?"
-                        elif 'upload' in last_bot_msg:
-                            return "Perfect! Please use the file uploader in the sidebar to upload your PDF documents. 📄"
-                
-                return "Great! What would you like to do? I can help you with questions about our services or make a booking. Just say 'I want to book' to get started! 😊"
+            messages = self._build_general_messages(user_message, conversation_history)
             
-            elif user_message_lower in ['no', 'nope', 'nah', 'not really']:
-                return "No problem! Is there anything else I can help you with? Feel free to ask questions or say 'I want to book' if you'd like to make a booking later! 😊"
+            for chunk in self.llm.stream(messages):
+                yield chunk.content
+            
+        except Exception as e:
+            yield f"Sorry, I encountered an error: {str(e)}"
+    
+    async def aget_rag_response(self, query, conversation_history):
+        """Async get_rag_response; awaits the LLM instead of blocking a thread"""
+        try:
+            if query.lower().strip() in _VAGUE_QUERIES:
+                return await self.aget_general_response(query, conversation_history)
             
-            # Handle greetings
-            greetings = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening']
-            if user_message_lower in greetings:
-                return (
-                    "Hello! 👋 Welcome to our booking assistant. I'm here to help you!\n\n"
-                    "I can:\n"
-                    "• Answer questions about our services (upload PDFs first)\n"
-                    "• Help you make bookings\n"
-                    "• Provide information and assistance\n\n"
-                    "What would you like to do today?"
-                )
+            # Retrieval runs in a worker thread while the history is rendered here;
+            # yield once so the task gets to hand the lookup to its thread first
+            retrieval = asyncio.ensure_future(self.rag_pipeline.aquery(query))
+            await asyncio.sleep(0)
+            memory_context = self._build_memory_context(conversation_history, limit=RAG_MEMORY_MESSAGES)
+            context = await retrieval
             
-            # Handle thank you
-            if any(word in user_message_lower for word in ['thank', 'thanks', 'thx']):
-                return "You're welcome! 😊 Is there anything else I can help you with?"
+            if not context:
+                return _NO_CONTEXT_RESPONSE
             
-            # Handle goodbye
-            if any(word in user_message_lower for word in ['bye', 'goodbye', 'see you']):
-                return "Goodbye! Have a great day! Feel free to come back anytime you need help. 👋"
+            messages = self._build_rag_messages(query, context, conversation_history, memory_context)
             
-            # Handle document upload mentions
-            if any(word in user_message_lower for word in ['upload', 'uploaded', 'document', 'pdf', 'file']):
-                return (
-                    "Great! To upload documents:\n"
-                    "1. Look for the 📄 file uploader in the sidebar\n"
-                    "2. Select your PDF files\n"
-                    "3. Click '📤 Process PDFs'\n"
-                    "4. Then you can ask me questions about the content!\n\n"
-                    "📋 Your PDFs should contain service info, pricing, hours, etc."
-                )
+            response = await self.llm.ainvoke(messages)
+            return self._check_rag_result(response.content)
             
-            # General conversation
-            memory_context = self._build_memory_context(conversation_history)
+        except Exception as e:
+            return f"Sorry, I encountered an error: {str(e)}"
+    
+    async def abatch_respond(self, items):
+        """Async batch_respond: all retrievals run concurrently, then one batched LLM call"""
+        responses = [None] * len(items)
+        lookups = []
+        
+        for i, (query, conversation_history) in enumerate(items):
+            if query.lower().strip() in _VAGUE_QUERIES:
+                responses[i] = await self.aget_general_response(query, conversation_history)
+            else:
+                lookups.append(i)
+        
+        contexts = await asyncio.gather(
+            *[self.rag_pipeline.aquery(items[i][0]) for i in lookups],
+            return_exceptions=True
+        )
+        
+        pending = []
+        for i, context in zip(lookups, contexts):
+            query, conversation_history = items[i]
+            if isinstance(context, Exception):
+                responses[i] = f"Sorry, I encountered an error: {str(context)}"
+            elif not context:
+                responses[i] = _NO_CONTEXT_RESPONSE
+            else:
+                pending.append((i, self._build_rag_messages(query, context, conversation_history)))
+        
+        if pending:
+            results = await self.llm.abatch(
+                [messages for _, messages in pending],
+                config={"max_concurrency": 10},
+                return_exceptions=True
+            )
+            for (i, _), result in zip(pending, results):
+                if isinstance(result, Exception):
+                    responses[i] = f"Sorry, I encountered an error: {str(result)}"
+                else:
+                    responses[i] = self._check_rag_result(result.content)
+        
+        return responses
+    
+    async def aget_general_response(self, user_message, conversation_history):
+        """Async get_general_response"""
+        try:
+            canned = self._canned_general_response(user_message, conversation_history)
+            if canned is not None:
+                return canned
             
-            system_prompt = """You are a friendly and professional booking assistant. 
+            messages = self._build_general_messages(user_message, conversation_history)
+            
+            response = await self.llm.ainvoke(messages)
+            return response.content
+            
+        except Exception as e:
+            return f"Sorry, I encountered an error: {str(e)}"
+    
+    def _canned_general_response(self, user_message, conversation_history):
+        """Fixed reply for yes/no, greetings, thanks, goodbyes and upload questions; None otherwise"""
+        user_message_lower = user_message.lower().strip()
+        
+        # Handle simple yes/no responses based on context
+        if user_message_lower in _AFFIRMATIVE_REPLIES:
+            # Check recent conversation
+            if conversation_history:
+                last_bot_msg = None
+                for msg in islice(reversed(conversation_history), 3):
+                    if msg['role'] == 'assistant':
+                        last_bot_msg = _content_lower(msg)
+                        break
+                
+                if last_bot_msg:
+                    if 'want to book' in last_bot_msg or 'make a booking' in last_bot_msg:
+                        return _CANNED['start_booking']
+                    elif 'upload' in last_bot_msg:
+                        return _CANNED['upload_prompt']
+            
+            return _CANNED['affirmative']
+        
+        # Exact replies: no/nope/..., greetings
+        if user_message_lower in _EXACT_REPLIES:
+            return _EXACT_REPLIES[user_message_lower]
+        
+        # Keyword replies: thanks, goodbye, upload; first bucket in priority order wins
+        best = None
+        for match in _CANNED_KEYWORD_RE.finditer(user_message_lower):
+            rank = _CANNED_KEYWORD_RANK[match.group(1)]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        
+        if best is not None:
+            return _CANNED[_CANNED_BUCKETS[best]]
+        
+        return None
+    
+    def _build_general_messages(self, user_message, conversation_history):
+        """Assemble the general conversation prompt messages"""
+        memory_context = self._build_memory_context(conversation_history)
+        
+        system_prompt = """You are a friendly and professional booking assistant. 
 
 Key behaviors:
 - Be warm, friendly, and helpful
@@ -245,37 +502,28 @@ Available services:
 - Travel Booking, Spa Treatment, Consultation
 
 NEVER discuss topics like "fake images", "AI detection", "e-commerce" or anything unrelated to booking services."""
-            
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=f"Recent conversation:\n{memory_context}\n\nUser: {user_message}\n\nRespond helpfully and concisely:")
-            ]
-            
-            response = self.llm.invoke(messages)
-            return response.content
-            
-        except Exception as e:
-            return f"Sorry, I encountered an error: {str(e)}"
+        
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=f"Recent conversation:\n{memory_context}\n\nUser: {user_message}\n\nRespond helpfully and concisely:")
+        ]
+        
+        return messages
     
-    def _build_memory_context(self, conversation_history):
-        """Build context string from conversation history"""
+    def _build_memory_context(self, conversation_history, limit=None):
+        """Build context string from conversation history, optionally only the last `limit` messages"""
         if not conversation_history:
             return "No previous conversation."
         
-        recent_messages = conversation_history[-MAX_MEMORY_MESSAGES:]
-        
-        context_parts = []
-        for msg in recent_messages:
-            role = "User" if msg['role'] == 'user' else "Assistant"
-            context_parts.append(f"{role}: {msg['content'][:200]}")
+        messages = conversation_history
+        if limit is not None and len(conversation_history) > limit:
+            messages = islice(conversation_history, len(conversation_history) - limit, None)
         
-        return "\n".join(context_parts)
-    
-    def manage_memory(self, messages):
-        """Manage conversation memory to keep only recent messages"""
-        if len(messages) > MAX_MEMORY_MESSAGES:
-            return messages[-MAX_MEMORY_MESSAGES:]
-        return messages
+        # History is bounded by new_history(); each line was rendered on append
+        return "\n".join(
+            msg['_rendered'] if '_rendered' in msg else _render_message(msg['role'], msg['content'])
+            for msg in messages
+        )
     
     def process_widget_selection(self, user_message):
         """Check if user is referencing a widget selection"""
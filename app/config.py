@@ -1,14 +1,13 @@
 import os
+import re
+from functools import lru_cache
 import streamlit as st
 
 # ============================================================================
 # LLM Configuration
 # ============================================================================
-# Get API key from Streamlit secrets or environment
-if hasattr(st, 'secrets') and 'GROQ_API_KEY' in st.secrets:
-    GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
-else:
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+# API key is read from Streamlit secrets or environment on first access
+# (see the lazy settings at the end of this module)
 
 # IMPORTANT: Use current supported model (llama-3.1-70b-versatile is DECOMMISSIONED)
 GROQ_MODEL = "llama-3.3-70b-versatile"
@@ -16,16 +15,16 @@ GROQ_MODEL = "llama-3.3-70b-versatile"
 # ============================================================================
 # Email Configuration
 # ============================================================================
-if hasattr(st, 'secrets'):
-    SMTP_SERVER = st.secrets.get("SMTP_SERVER", "smtp.gmail.com")
-    SMTP_PORT = st.secrets.get("SMTP_PORT", 587)
-    SENDER_EMAIL = st.secrets.get("SENDER_EMAIL", "")
-    SENDER_PASSWORD = st.secrets.get("SENDER_PASSWORD", "")
-else:
-    SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-    SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-    SENDER_EMAIL = os.getenv("SENDER_EMAIL", "")
-    SENDER_PASSWORD = os.getenv("SENDER_PASSWORD", "")
+# SMTP_SERVER, SMTP_PORT, SENDER_EMAIL and SENDER_PASSWORD are read lazily
+# (see the lazy settings at the end of this module)
+
+# Attach the HTML version of confirmation emails; plain text only when False
+EMAIL_HTML_ENABLED = True
+
+# Send attempts per confirmation email; the wait starts at EMAIL_RETRY_BACKOFF
+# seconds and doubles after each failed attempt
+EMAIL_SEND_ATTEMPTS = 3
+EMAIL_RETRY_BACKOFF = 2
 
 # ============================================================================
 # Database Configuration
@@ -35,29 +34,54 @@ SQLITE_DB_PATH = "db/bookings.db"
 
 # Optional: Supabase Configuration (if you want to use it instead)
 USE_SUPABASE = False
-if hasattr(st, 'secrets'):
-    SUPABASE_URL = st.secrets.get("SUPABASE_URL", "")
-    SUPABASE_KEY = st.secrets.get("SUPABASE_KEY", "")
-else:
-    SUPABASE_URL = os.getenv("SUPABASE_URL", "")
-    SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
+# SUPABASE_URL and SUPABASE_KEY are read lazily, only if something asks for them
 
 # ============================================================================
 # RAG Configuration
 # ============================================================================
 CHROMA_PERSIST_DIR = "db/chroma_db"
+# LangChain's default collection name, so stores indexed before PersistentClient still load
+CHROMA_COLLECTION = "langchain"
+# HNSW index settings, applied when the collection is created (existing collections keep theirs)
+CHROMA_HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:construction_ef": 200,
+    "hnsw:M": 32,
+    "hnsw:search_ef": 64,
+}
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 
+# Embedding model; "fastembed" runs it on ONNX Runtime (optional package), "huggingface" on PyTorch
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+
+# Embedding device: "auto" picks cuda, then mps, then cpu; or force one of them
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "auto")
+EMBEDDING_BATCH_SIZE = 64
+
+# Threads used to read and chunk uploaded PDFs in parallel
+PDF_WORKERS = 4
+
+# Chunks written to Chroma per add_documents call when indexing PDFs
+INGEST_BATCH_SIZE = 2048
+
 # Number of relevant chunks to retrieve for RAG
 RAG_K_CHUNKS = 4
 
+# Retrieval results kept per pipeline for repeated questions
+QUERY_CACHE_SIZE = 256
+
 # ============================================================================
 # Chat Configuration
 # ============================================================================
 # Maximum number of messages to keep in conversation memory
 MAX_MEMORY_MESSAGES = 25
 
+# Messages of history included in RAG prompts; the documents carry the facts,
+# so only the last few turns are needed to resolve follow-up questions
+RAG_MEMORY_MESSAGES = 6
+
 # ============================================================================
 # Booking Configuration
 # ============================================================================
@@ -146,7 +170,7 @@ BOOKING_FIELDS = {
         "label": "Email Address",
         "question": "What's your email address?",
         "validation": "email",
-        "pattern": r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}$'
+        "pattern": r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$'
     },
     "phone": {
         "label": "Phone Number",
@@ -175,6 +199,9 @@ BOOKING_FIELDS = {
     }
 }
 
+# Compiled once; shared by every email validation
+EMAIL_RE = re.compile(BOOKING_FIELDS["email"]["pattern"], re.ASCII)
+
 # ============================================================================
 # UI Configuration
 # ============================================================================
@@ -226,4 +253,73 @@ ERROR_MESSAGES = {
     "email_failed": "⚠️ Your booking was saved, but we couldn't send the confirmation email.",
     "pdf_processing_failed": "❌ Failed to process PDFs. Please try again.",
     "general_error": "❌ An error occurred. Please try again or contact support."
-}
\ No newline at end of file
+}
+
+# ============================================================================
+# Lazy Settings
+# ============================================================================
+# Secrets are read on first use instead of at import, so importing this module
+# for constants never touches st.secrets.
+
+def _secret(name, default=""):
+    """Read a setting from Streamlit secrets, falling back to the environment"""
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except Exception:
+        # No secrets file configured
+        pass
+    return os.getenv(name, default)
+
+
+@lru_cache(maxsize=None)
+def groq_api_key():
+    return _secret("GROQ_API_KEY")
+
+
+@lru_cache(maxsize=None)
+def smtp_server():
+    return _secret("SMTP_SERVER", "smtp.gmail.com")
+
+
+@lru_cache(maxsize=None)
+def smtp_port():
+    return int(_secret("SMTP_PORT", 587))
+
+
+@lru_cache(maxsize=None)
+def sender_email():
+    return _secret("SENDER_EMAIL")
+
+
+@lru_cache(maxsize=None)
+def sender_password():
+    return _secret("SENDER_PASSWORD")
+
+
+@lru_cache(maxsize=None)
+def supabase_url():
+    return _secret("SUPABASE_URL")
+
+
+@lru_cache(maxsize=None)
+def supabase_key():
+    return _secret("SUPABASE_KEY")
+
+
+_LAZY_SETTINGS = {
+    "GROQ_API_KEY": groq_api_key,
+    "SMTP_SERVER": smtp_server,
+    "SMTP_PORT": smtp_port,
+    "SENDER_EMAIL": sender_email,
+    "SENDER_PASSWORD": sender_password,
+    "SUPABASE_URL": supabase_url,
+    "SUPABASE_KEY": supabase_key,
+}
+
+
+def __getattr__(name):
+    """Keep `from app.config import GROQ_API_KEY` and friends working"""
+    if name in _LAZY_SETTINGS:
+        return _LAZY_SETTINGS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,18 @@
+import streamlit as st
+from langchain_groq import ChatGroq
+from app.config import GROQ_MODEL, groq_api_key
+
+
+@st.cache_resource
+def get_llm(temperature=0.7, max_tokens=2048):
+    """Shared ChatGroq client, built once per process for each settings pair"""
+    api_key = groq_api_key()
+    if not api_key:
+        raise ValueError("GROQ_API_KEY not found")
+    
+    return ChatGroq(
+        api_key=api_key,
+        model=GROQ_MODEL,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
@@ -1,30 +1,181 @@
 import streamlit as st
 import os
+import re
 import sys
-import time
+from itertools import islice
 
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# `streamlit run app/main.py` puts app/ on the path, not the project root
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
 
-from app.rag_pipeline import RAGPipeline
-from app.chat_logic import ChatLogic
-from app.booking_flow import BookingFlow
-from app.admin_dashboard import show_admin_dashboard
-from app.config import MAX_MEMORY_MESSAGES
+# Heavy modules (embeddings, vector store, LLM clients) are imported inside the
+# cached factories below, so the page paints before they load
+from app.chat_logic import new_history, new_message
+from app.config import INGEST_BATCH_SIZE
+
+
+# Static markup, built once at import and re-sent on each rerun
+_WELCOME_HTML = """
+    <div style="padding:30px;border-radius:18px;background:var(--gradient);color:white;margin-top:20px;">
+        <h2 style="text-align:center;margin:0 0 10px 0;">👋 Hey there!</h2>
+        <p style="text-align:center;font-size:16px;margin-bottom:18px;">
+            I'm your <b>AI Booking Assistant</b>. I can help you book appointments & answer questions from PDFs.
+        </p>
+        <div style="padding:18px;background:rgba(255,255,255,0.15);border-radius:14px;">
+            <b>✨ Try saying:</b>
+            <ul>
+                <li>“Book an appointment for tomorrow”</li>
+                <li>“How much is the facial treatment?”</li>
+                <li>“Upload PDF and ask questions about it”</li>
+            </ul>
+        </div>
+        <p style="text-align:center;margin-top:15px;">
+            Upload a PDF or just start chatting 💬
+        </p>
+    </div>
+    """
+
+# Substring match, like the `in` checks it replaces ('pdfs', 'files' still hit)
+_UPLOAD_RE = re.compile('upload|document|pdf|file')
+# Most recent messages always rendered; history itself is capped at MAX_MEMORY_MESSAGES
+_VISIBLE_MESSAGES = 20
+
+# Booking fields shown in the sidebar progress block
+_REQUIRED_FIELDS = ('name', 'email', 'phone', 'booking_type', 'date', 'time')
+_FIELD_EMOJI = {
+    'name': '👤',
+    'email': '📧',
+    'phone': '📱',
+    'booking_type': '🎯',
+    'date': '📅',
+    'time': '⏰'
+}
+
+_SIMPLE_REPLIES = frozenset({'yes', 'no', 'ok', 'sure'})
+
+_TYPING_HTML = "`typing` <span class='typing-dot'>●</span><span class='typing-dot' style='animation-delay:0.2s;'>●</span><span class='typing-dot' style='animation-delay:0.4s;'>●</span>"
+
+_CUSTOM_CSS = """
+        <style>
+        :root {
+            --primary: #6d5dfc;
+            --secondary: #4b5dff;
+            --gradient: linear-gradient(135deg, #6d5dfc 0%, #4b5dff 100%);
+            --glass-bg: rgba(255,255,255,0.08);
+            --glass-border: rgba(255,255,255,0.15);
+            --radius: 14px;
+        }
+
+        /* App background */
+        .main {
+            background: #0d1117;
+            color: white;
+        }
+
+        /* Sidebar */
+        section[data-testid="stSidebar"] {
+            background: rgba(18, 21, 27, 0.9);
+            backdrop-filter: blur(12px);
+            border-right: 1px solid rgba(255,255,255,0.05);
+        }
+
+        /* Buttons */
+        .stButton>button {
+            background: var(--gradient);
+            color: white;
+            border-radius: var(--radius);
+            padding: 8px 16px;
+            font-weight: 600;
+            border: none;
+            transition: 0.2s;
+        }
+        .stButton>button:hover {
+            filter: brightness(1.1);
+            transform: translateY(-1px);
+        }
+
+        /* Chat Input */
+        textarea {
+            border-radius: var(--radius) !important;
+            background: rgba(255,255,255,0.07) !important;
+            border: 1px solid rgba(255,255,255,0.15) !important;
+            color: white !important;
+        }
+
+        /* Chat bubbles */
+        div[data-testid="stChatMessageContainer"] {
+            padding: 0 !important;
+        }
+        div[data-testid="stChatMessage"] {
+            border-radius: var(--radius);
+            padding: 12px 16px;
+            margin-bottom: 12px;
+            backdrop-filter: blur(12px);
+        }
+        div[data-testid="stChatMessage"].st-chat-message-user {
+            background: var(--glass-bg);
+            border: 1px solid var(--glass-border);
+            margin-left: auto;
+            max-width: 80%;
+        }
+        div[data-testid="stChatMessage"].st-chat-message-assistant {
+            background: rgba(109, 93, 252, 0.18);
+            border: 1px solid rgba(109, 93, 252, 0.25);
+            max-width: 80%;
+        }
+
+        /* Typing animation */
+        @keyframes typing {
+            0% { opacity: 0.2; }
+            20% { opacity: 1; }
+            100% { opacity: 0.2; }
+        }
+        .typing-dot {
+            animation: typing 1s infinite ease-in-out;
+        }
+        </style>
+    """
+
+# Sent on every rerun (an element not re-emitted is removed), so ship it minified
+_CUSTOM_CSS = re.sub(r'\s*([{};:,>])\s*', r'\1', re.sub(r'/\*.*?\*/|\s+', ' ', _CUSTOM_CSS, flags=re.S)).strip()
+
+
+@st.cache_resource
+def get_rag_pipeline():
+    """RAG pipeline (embedding model + vector store), loaded once per process"""
+    from app.rag_pipeline import RAGPipeline
+    return RAGPipeline()
+
+
+@st.cache_resource
+def get_chat_logic(_rag_pipeline):
+    """Shared ChatLogic; holds no per-session state"""
+    from app.chat_logic import ChatLogic
+    return ChatLogic(_rag_pipeline)
+
+
+@st.cache_resource
+def get_booking_flow(_chat_logic):
+    """Shared BookingFlow; booking data is passed in from session state"""
+    from app.booking_flow import BookingFlow
+    return BookingFlow(_chat_logic)
 
 
 def initialize_session_state():
     """Initialize all session state variables"""
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = new_history()
     
+    # Stateless services are shared by every session; only per-user state lives here
     if "rag_pipeline" not in st.session_state:
-        st.session_state.rag_pipeline = RAGPipeline()
+        st.session_state.rag_pipeline = get_rag_pipeline()
     
     if "chat_logic" not in st.session_state:
-        st.session_state.chat_logic = ChatLogic(st.session_state.rag_pipeline)
+        st.session_state.chat_logic = get_chat_logic(st.session_state.rag_pipeline)
     
     if "booking_flow" not in st.session_state:
-        st.session_state.booking_flow = BookingFlow(st.session_state.chat_logic)
+        st.session_state.booking_flow = get_booking_flow(st.session_state.chat_logic)
     
     if "booking_data" not in st.session_state:
         st.session_state.booking_data = {}
@@ -37,6 +188,10 @@ def initialize_session_state():
     
     if "current_page" not in st.session_state:
         st.session_state.current_page = "chat"
+    
+    # (recipient, Future) for the last confirmation email sent from this session
+    if "email_job" not in st.session_state:
+        st.session_state.email_job = None
 
 
 # def show_welcome_message():
@@ -65,248 +220,309 @@ def initialize_session_state():
 #         """, unsafe_allow_html=True)
 
 def show_welcome_message():
-    st.markdown("""
-    <div style="padding:30px;border-radius:18px;background:var(--gradient);color:white;margin-top:20px;">
-        <h2 style="text-align:center;margin:0 0 10px 0;">👋 Hey there!</h2>
-        <p style="text-align:center;font-size:16px;margin-bottom:18px;">
-            I'm your <b>AI Booking Assistant</b>. I can help you book appointments & answer questions from PDFs.
-        </p>
-        <div style="padding:18px;background:rgba(255,255,255,0.15);border-radius:14px;">
-            <b>✨ Try saying:</b>
-            <ul>
-                <li>“Book an appointment for tomorrow”</li>
-                <li>“How much is the facial treatment?”</li>
-                <li>“Upload PDF and ask questions about it”</li>
-            </ul>
-        </div>
-        <p style="text-align:center;margin-top:15px;">
-            Upload a PDF or just start chatting 💬
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
+    """Show welcome message when chat is empty"""
+    st.markdown(_WELCOME_HTML, unsafe_allow_html=True)
 
 
 
-def chat_page():
-    """Main chat interface with enhanced UI"""
-    st.title("🤖 AI Booking Assistant")
+def _booking_progress(booking_data):
+    """(progress, caption, collected-fields text), recomputed only when the collected set changes"""
+    key = tuple(bool(booking_data.get(field)) for field in _REQUIRED_FIELDS)
+    cached = st.session_state.get('_booking_progress_cache')
+    if cached and cached[0] == key:
+        return cached[1]
     
-    # Sidebar
-    with st.sidebar:
-        st.header("📚 Document Management")
+    collected = [field for field, present in zip(_REQUIRED_FIELDS, key) if present]
+    
+    # Calculate progress (ensure it's between 0 and 1)
+    progress = min(len(collected) / len(_REQUIRED_FIELDS), 1.0)
+    caption = f"{len(collected)}/{len(_REQUIRED_FIELDS)} fields collected"
+    fields_text = "\n".join(
+        f"{_FIELD_EMOJI.get(field, '✓')} {field.replace('_', ' ').title()}" for field in collected
+    )
+    
+    result = (progress, caption, fields_text)
+    st.session_state['_booking_progress_cache'] = (key, result)
+    return result
+
+
+def _clear_suggestions():
+    """Forget the date/time picked in the sidebar pickers"""
+    st.session_state.pop('suggested_date', None)
+    st.session_state.pop('suggested_time', None)
+
+
+def queue_prompt(prompt):
+    """Button callback: answer `prompt` as if it had been typed"""
+    st.session_state.pending_prompt = prompt
+
+
+def render_message(message):
+    """Render one chat bubble"""
+    with st.chat_message(message["role"], avatar="👤" if message["role"] == "user" else "🤖"):
+        st.markdown(message["content"])
+
+
+@st.fragment(run_every=2)
+def render_email_status():
+    """Outcome of the session's last confirmation email; polls while it is still sending"""
+    recipient, email_job = st.session_state.email_job
+    
+    if not email_job.done():
+        st.info(f"Sending to {recipient}...")
+    elif not email_job.exception() and email_job.result():
+        st.success(f"Delivered to {recipient}")
+    else:
+        st.warning(f"Could not be delivered to {recipient}; the booking is still saved")
+
+
+def render_chat_sidebar():
+    """Chat page sidebar: documents, controls, booking progress and tips; returns the message-count slot"""
+    st.header("📚 Document Management")
+    
+    # PDF Upload Section
+    with st.container():
+        st.markdown("### 📤 Upload Documents")
+        uploaded_files = st.file_uploader(
+            "Upload PDF documents",
+            type=['pdf'],
+            accept_multiple_files=True,
+            key="pdf_uploader",
+            help="Upload service brochures, menus, or information PDFs"
+        )
         
-        # PDF Upload Section
-        with st.container():
-            st.markdown("### 📤 Upload Documents")
-            uploaded_files = st.file_uploader(
-                "Upload PDF documents",
-                type=['pdf'],
-                accept_multiple_files=True,
-                key="pdf_uploader",
-                help="Upload service brochures, menus, or information PDFs"
+        if uploaded_files:
+            batch_size = st.slider(
+                "Indexing batch size",
+                min_value=64,
+                max_value=INGEST_BATCH_SIZE,
+                value=INGEST_BATCH_SIZE,
+                step=64,
+                key="embed_batch_size",
+                help="Chunks embedded and stored per batch while processing"
             )
             
-            if uploaded_files:
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("📤 Process", use_container_width=True, type="primary"):
-                        with st.spinner("🔄 Processing..."):
-                            success, message = st.session_state.rag_pipeline.process_pdfs(uploaded_files)
-                            
-                            if success:
-                                st.success(f"✅ {message}")
-                                st.session_state.pdfs_uploaded = True
-                                st.balloons()
-                            else:
-                                st.error(f"❌ {message}")
-                
-                with col2:
-                    if st.session_state.pdfs_uploaded:
-                        if st.button("🔄 Clear", use_container_width=True):
-                            success, message = st.session_state.rag_pipeline.clear_vector_store()
-                            if success:
-                                st.success(message)
-                                st.session_state.pdfs_uploaded = False
-                                st.rerun()
-        
-        # Status & Suggested Questions
-        if st.session_state.pdfs_uploaded:
-            st.success("✅ Documents ready")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("📤 Process", use_container_width=True, type="primary"):
+                    with st.status("🔄 Processing...") as status:
+                        def report_progress(done, total):
+                            status.update(label=f"🔄 Embedded {done}/{total} chunks")
+                        
+                        success, message = st.session_state.rag_pipeline.process_pdfs(
+                            uploaded_files,
+                            batch_size=batch_size,
+                            progress=report_progress
+                        )
+                        
+                        status.update(
+                            label="✅ Processed" if success else "❌ Processing failed",
+                            state="complete" if success else "error"
+                        )
+                    
+                    if success:
+                        st.success(f"✅ {message}")
+                        st.session_state.pdfs_uploaded = True
+                        st.balloons()
+                    else:
+                        st.error(f"❌ {message}")
             
-            # Show suggested questions if available
-            if hasattr(st.session_state, 'pdf_suggestions') and st.session_state.pdf_suggestions:
-                with st.expander("💡 Suggested Questions", expanded=True):
-                    st.markdown("**Try asking:**")
-                    for q in st.session_state.pdf_suggestions:
-                        if st.button(q, key=f"suggest_{q}", use_container_width=True):
-                            # Add question to chat
-                            st.session_state.messages.append({"role": "user", "content": q})
-                            response = generate_response(q)
-                            st.session_state.messages.append({"role": "assistant", "content": response})
+            with col2:
+                if st.session_state.pdfs_uploaded:
+                    if st.button("🔄 Clear", use_container_width=True):
+                        success, message = st.session_state.rag_pipeline.clear_vector_store()
+                        if success:
+                            st.success(message)
+                            st.session_state.pdfs_uploaded = False
                             st.rerun()
-        else:
-            st.info("📄 No documents loaded")
+    
+    # Status & Suggested Questions
+    if st.session_state.pdfs_uploaded:
+        st.success("✅ Documents ready")
         
+        # Show suggested questions if available
+        if st.session_state.get('pdf_suggestions'):
+            with st.expander("💡 Suggested Questions", expanded=True):
+                st.markdown("**Try asking:**")
+                for q, key in st.session_state.pdf_suggestions:
+                    # Queued before the script reruns; answered by the chat input path
+                    st.button(
+                        q,
+                        key=key,
+                        use_container_width=True,
+                        on_click=queue_prompt,
+                        args=(q,)
+                    )
+    else:
+        st.info("📄 No documents loaded")
+    
+    st.markdown("---")
+    
+    # Chat Controls
+    st.markdown("### 🎛️ Controls")
+    
+    if st.button("🗑️ Clear Chat", use_container_width=True):
+        st.session_state.messages = new_history()
+        st.session_state.booking_data = {}
+        st.session_state.awaiting_confirmation = False
+        _clear_suggestions()
+        st.success("Chat cleared!")
+        st.rerun()
+    
+    # Booking Progress
+    if st.session_state.booking_data:
         st.markdown("---")
+        st.markdown("### 📋 Booking Progress")
         
-        # Chat Controls
-        st.markdown("### 🎛️ Controls")
+        progress, caption, fields_text = _booking_progress(st.session_state.booking_data)
         
-        if st.button("🗑️ Clear Chat", use_container_width=True):
-            st.session_state.messages = []
-            st.session_state.booking_data = {}
-            st.session_state.awaiting_confirmation = False
-            if hasattr(st.session_state, 'suggested_date'):
-                delattr(st.session_state, 'suggested_date')
-            if hasattr(st.session_state, 'suggested_time'):
-                delattr(st.session_state, 'suggested_time')
-            st.success("Chat cleared!")
-            st.rerun()
+        st.progress(progress)
+        st.caption(caption)
+        st.text(fields_text)
+    
+    # Confirmation email outcome
+    if st.session_state.email_job:
+        st.markdown("---")
+        st.markdown("### 📧 Confirmation Email")
+        render_email_status()
+    
+    st.markdown("---")
+    
+    # Quick Tips & PDF Guidelines
+    with st.expander("💡 Quick Tips", expanded=False):
+        st.markdown("""
+        **📅 Making a Booking:**
+        - Say "I want to book"
+        - Use calendar/time pickers when they appear
+        - I'll validate everything in real-time
         
-        # Booking Progress
-        if st.session_state.booking_data:
-            st.markdown("---")
-            st.markdown("### 📋 Booking Progress")
-            
-            # Get only valid required fields (exclude any extra fields)
-            required_fields = ['name', 'email', 'phone', 'booking_type', 'date', 'time']
-            collected = [k for k in required_fields if k in st.session_state.booking_data and st.session_state.booking_data[k]]
-            
-            # Calculate progress (ensure it's between 0 and 1)
-            progress = min(len(collected) / len(required_fields), 1.0)
-            
-            st.progress(progress)
-            st.caption(f"{len(collected)}/{len(required_fields)} fields collected")
-            
-            # Show collected fields
-            field_emoji = {
-                'name': '👤',
-                'email': '📧',
-                'phone': '📱',
-                'booking_type': '🎯',
-                'date': '📅',
-                'time': '⏰'
-            }
-            
-            for field in collected:
-                emoji = field_emoji.get(field, '✓')
-                st.text(f"{emoji} {field.replace('_', ' ').title()}")
+        **🗓️ Date & Time:**
+        - Use YYYY-MM-DD format (2025-01-25)
+        - Use HH:MM format (14:30)
+        - Can't book past dates/times
         
-        st.markdown("---")
+        **📧 Email Format:** 
+        - name@example.com
         
-        # Quick Tips & PDF Guidelines
-        with st.expander("💡 Quick Tips", expanded=False):
-            st.markdown("""
-            **📅 Making a Booking:**
-            - Say "I want to book"
-            - Use calendar/time pickers when they appear
-            - I'll validate everything in real-time
-            
-            **🗓️ Date & Time:**
-            - Use YYYY-MM-DD format (2025-01-25)
-            - Use HH:MM format (14:30)
-            - Can't book past dates/times
-            
-            **📧 Email Format:** 
-            - name@example.com
-            
-            **📱 Phone:** 
-            - 10-15 digits
-            """)
+        **📱 Phone:** 
+        - 10-15 digits
+        """)
+    
+    with st.expander("📄 PDF Upload Guidelines", expanded=False):
+        st.markdown("""
+        **✅ Your PDFs should include:**
+        - Service descriptions and offerings
+        - Pricing information
+        - Business hours and availability
+        - Contact information (phone, email, address)
+        - FAQ or helpful information
         
-        with st.expander("📄 PDF Upload Guidelines", expanded=False):
-            st.markdown("""
-            **✅ Your PDFs should include:**
-            - Service descriptions and offerings
-            - Pricing information
-            - Business hours and availability
-            - Contact information (phone, email, address)
-            - FAQ or helpful information
-            
-            **❌ Avoid uploading:**
-            - Scanned images (no selectable text)
-            - Password-protected files
-            - Files with less than 100 characters
-            - Only tables/numbers without context
-            
-            **💡 Best practices:**
-            - Use text-based PDFs (not scanned)
-            - Include detailed descriptions
-            - Organize with clear headings
-            - Keep information current
-            
-            *The system will validate your PDFs and give you specific feedback!*
-            """)
+        **❌ Avoid uploading:**
+        - Scanned images (no selectable text)
+        - Password-protected files
+        - Files with less than 100 characters
+        - Only tables/numbers without context
         
-        # Stats
-        st.markdown("---")
-        st.markdown("### 📊 Session Stats")
-        st.metric("Messages", len(st.session_state.messages))
-        if st.session_state.pdfs_uploaded:
-            st.metric("Documents", "Active", delta="Ready")
+        **💡 Best practices:**
+        - Use text-based PDFs (not scanned)
+        - Include detailed descriptions
+        - Organize with clear headings
+        - Keep information current
+        
+        *The system will validate your PDFs and give you specific feedback!*
+        """)
     
-    # Main chat area
-    if len(st.session_state.messages) == 0:
-        show_welcome_message()
+    # Stats
+    st.markdown("---")
+    st.markdown("### 📊 Session Stats")
+    # Placeholder so chat_page can refresh the count after this run's turn
+    messages_metric = st.empty()
+    messages_metric.metric("Messages", len(st.session_state.messages))
+    if st.session_state.pdfs_uploaded:
+        st.metric("Documents", "Active", delta="Ready")
     
-    # Display messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"], avatar="👤" if message["role"] == "user" else "🤖"):
-            st.markdown(message["content"])
+    return messages_metric
+
 
+def chat_page(messages_metric=None):
+    """Main chat interface with enhanced UI"""
+    st.title("🤖 AI Booking Assistant")
+    
+    # Main chat area; the welcome card is cleared in place once the chat starts
+    welcome_slot = st.empty()
+    if len(st.session_state.messages) == 0:
+        with welcome_slot.container():
+            show_welcome_message()
+    
+    # Display messages; older ones are only rendered on request
+    messages = st.session_state.messages
+    hidden = max(0, len(messages) - _VISIBLE_MESSAGES)
+    
+    if hidden and st.toggle(f"Show {hidden} earlier message(s)", key="show_earlier"):
+        for message in islice(messages, hidden):
+            render_message(message)
+    
+    for message in islice(messages, hidden, None):
+        render_message(message)
     
     # Chat input
-    if prompt := st.chat_input("💬 Type your message here...", key="chat_input"):
+    # Suggested questions arrive through the same path as typed messages
+    typed = st.chat_input("💬 Type your message here...", key="chat_input")
+    if prompt := typed or st.session_state.pop("pending_prompt", None):
         
         # Check if user is using widget selection
         widget_type, widget_value = st.session_state.chat_logic.process_widget_selection(prompt)
         
+        # A picked date/time is always a booking answer
+        intent = None
         if widget_type:
             # Replace message with actual value
             if widget_type == 'date':
                 prompt = widget_value
             elif widget_type == 'time':
                 prompt = widget_value
+            intent = 'booking'
         
-        # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        # Add user message and draw it now; this run already rendered the history
+        user_message = new_message("user", prompt)
+        st.session_state.messages.append(user_message)
+        welcome_slot.empty()
+        render_message(user_message)
         
-        # with st.chat_message("user", avatar="👤"):
-        #     st.markdown(prompt)
-        with st.chat_message("assistant", avatar="🤖"):
-            st.markdown("`typing` <span class='typing-dot'>●</span><span class='typing-dot' style='animation-delay:0.2s;'>●</span><span class='typing-dot' style='animation-delay:0.4s;'>●</span>", unsafe_allow_html=True)
-            time.sleep(0.7)
-
-
+        booking_state = (dict(st.session_state.booking_data), st.session_state.awaiting_confirmation)
         
-        # Generate response
-        with st.chat_message("assistant", avatar="🤖"):
-            with st.spinner("🤔 Thinking..."):
-                response = generate_response(prompt)
-                st.markdown(response)
+        # Stream the response; CSS-animated typing dots hold the slot until the first chunk
+        assistant_slot = st.chat_message("assistant", avatar="🤖").empty()
+        assistant_slot.markdown(_TYPING_HTML, unsafe_allow_html=True)
+        response = assistant_slot.write_stream(generate_response_stream(prompt, intent))
         
         # Add assistant response
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        st.session_state.messages.append(new_message("assistant", response))
         
-        # Manage memory
-        st.session_state.messages = st.session_state.chat_logic.manage_memory(
-            st.session_state.messages
-        )
+        # The sidebar was drawn before this turn; bring its message count up to date
+        if messages_metric is not None:
+            messages_metric.metric("Messages", len(st.session_state.messages))
         
-        st.rerun()
+        # Both bubbles are already on screen; rerun only to refresh the sidebar's booking progress
+        if (st.session_state.booking_data, st.session_state.awaiting_confirmation) != booking_state:
+            st.rerun()
 
 
-def generate_response(prompt):
-    """Generate response based on intent with better error handling"""
+def generate_response_stream(prompt, intent=None):
+    """Yield the response for `prompt`; LLM answers stream chunk by chunk, others come whole"""
     try:
+        # A booking in progress owns every turn, so intent detection is skipped
+        booking_active = bool(st.session_state.booking_data) or st.session_state.awaiting_confirmation
+        
         # Detect intent
-        intent = st.session_state.chat_logic.detect_intent(
-            prompt,
-            st.session_state.messages
-        )
+        if intent is None and not booking_active:
+            intent = st.session_state.chat_logic.detect_intent(
+                prompt,
+                st.session_state.messages
+            )
         
         # Handle booking flow
-        if intent == 'booking' or st.session_state.booking_data or st.session_state.awaiting_confirmation:
+        if booking_active or intent == 'booking':
             response, updated_data, awaiting, complete = st.session_state.booking_flow.handle_booking_intent(
                 prompt,
                 st.session_state.booking_data,
@@ -319,17 +535,14 @@ def generate_response(prompt):
             if complete:
                 st.session_state.booking_data = {}
                 st.session_state.awaiting_confirmation = False
-                if hasattr(st.session_state, 'suggested_date'):
-                    delattr(st.session_state, 'suggested_date')
-                if hasattr(st.session_state, 'suggested_time'):
-                    delattr(st.session_state, 'suggested_time')
+                _clear_suggestions()
             
-            return response
+            yield response
         
         # Handle RAG query
         elif intent == 'query':
             if st.session_state.pdfs_uploaded:
-                return st.session_state.chat_logic.get_rag_response(
+                yield from st.session_state.chat_logic.stream_rag_response(
                     prompt,
                     st.session_state.messages
                 )
@@ -337,8 +550,8 @@ def generate_response(prompt):
                 prompt_lower = prompt.lower().strip()
                 
                 # If user mentioned upload/document
-                if any(word in prompt_lower for word in ['upload', 'document', 'pdf', 'file']):
-                    return (
+                if _UPLOAD_RE.search(prompt_lower):
+                    yield (
                         "I see you're interested in uploading documents! 📄\n\n"
                         "To upload PDFs:\n"
                         "1. Use the file uploader in the left sidebar\n"
@@ -347,15 +560,17 @@ def generate_response(prompt):
                         "4. Then ask me questions about the content!\n\n"
                         "💡 Upload service brochures, menus, pricing lists, etc."
                     )
+                    return
                 
                 # If simple yes/no
-                if prompt_lower in ['yes', 'no', 'ok', 'sure']:
-                    return st.session_state.chat_logic.get_general_response(
+                if prompt_lower in _SIMPLE_REPLIES:
+                    yield from st.session_state.chat_logic.stream_general_response(
                         prompt,
                         st.session_state.messages
                     )
+                    return
                 
-                return (
+                yield (
                     "I'd be happy to answer questions about our services! However, I don't have any documents "
                     "uploaded yet.\n\n"
                     "**You can:**\n"
@@ -366,13 +581,13 @@ def generate_response(prompt):
         
         # General conversation
         else:
-            return st.session_state.chat_logic.get_general_response(
+            yield from st.session_state.chat_logic.stream_general_response(
                 prompt,
                 st.session_state.messages
             )
     
     except Exception as e:
-        return (
+        yield (
             f"❌ I encountered an error: {str(e)}\n\n"
             "Please try again. If the issue persists:\n"
             "• Clear the chat and start fresh\n"
@@ -411,86 +626,7 @@ def main():
     #     </style>
     # """, unsafe_allow_html=True)
         # Custom CSS (Gen-Z aesthetic upgrade)
-    st.markdown("""
-        <style>
-        :root {
-            --primary: #6d5dfc;
-            --secondary: #4b5dff;
-            --gradient: linear-gradient(135deg, #6d5dfc 0%, #4b5dff 100%);
-            --glass-bg: rgba(255,255,255,0.08);
-            --glass-border: rgba(255,255,255,0.15);
-            --radius: 14px;
-        }
-
-        /* App background */
-        .main {
-            background: #0d1117;
-            color: white;
-        }
-
-        /* Sidebar */
-        section[data-testid="stSidebar"] {
-            background: rgba(18, 21, 27, 0.9);
-            backdrop-filter: blur(12px);
-            border-right: 1px solid rgba(255,255,255,0.05);
-        }
-
-        /* Buttons */
-        .stButton>button {
-            background: var(--gradient);
-            color: white;
-            border-radius: var(--radius);
-            padding: 8px 16px;
-            font-weight: 600;
-            border: none;
-            transition: 0.2s;
-        }
-        .stButton>button:hover {
-            filter: brightness(1.1);
-            transform: translateY(-1px);
-        }
-
-        /* Chat Input */
-        textarea {
-            border-radius: var(--radius) !important;
-            background: rgba(255,255,255,0.07) !important;
-            border: 1px solid rgba(255,255,255,0.15) !important;
-            color: white !important;
-        }
-
-        /* Chat bubbles */
-        div[data-testid="stChatMessageContainer"] {
-            padding: 0 !important;
-        }
-        div[data-testid="stChatMessage"] {
-            border-radius: var(--radius);
-            padding: 12px 16px;
-            margin-bottom: 12px;
-            backdrop-filter: blur(12px);
-        }
-        div[data-testid="stChatMessage"].st-chat-message-user {
-            background: var(--glass-bg);
-            border: 1px solid var(--glass-border);
-            margin-left: auto;
-            max-width: 80%;
-        }
-        div[data-testid="stChatMessage"].st-chat-message-assistant {
-            background: rgba(109, 93, 252, 0.18);
-            border: 1px solid rgba(109, 93, 252, 0.25);
-            max-width: 80%;
-        }
-
-        /* Typing animation */
-        @keyframes typing {
-            0% { opacity: 0.2; }
-            20% { opacity: 1; }
-            100% { opacity: 0.2; }
-        }
-        .typing-dot {
-            animation: typing 1s infinite ease-in-out;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
 
     
     # Initialize
@@ -508,11 +644,16 @@ def main():
         )
         
         st.markdown("---")
+        
+        # Page-specific sidebar content goes in the same sidebar pass
+        if page == "💬 Chat & Booking":
+            messages_metric = render_chat_sidebar()
     
     # Route
     if page == "💬 Chat & Booking":
-        chat_page()
+        chat_page(messages_metric)
     elif page == "📊 Admin Dashboard":
+        from app.admin_dashboard import show_admin_dashboard
         show_admin_dashboard()
 
 
@@ -1,15 +1,169 @@
+import asyncio
 import os
-import sys
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple
+import chromadb
 from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 import streamlit as st
+from app.config import (
+    CHROMA_PERSIST_DIR, CHROMA_COLLECTION, CHROMA_HNSW_METADATA, CHUNK_SIZE, CHUNK_OVERLAP,
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_DEVICE, EMBEDDING_BATCH_SIZE,
+    PDF_WORKERS, INGEST_BATCH_SIZE, QUERY_CACHE_SIZE
+)
 
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app.config import CHROMA_PERSIST_DIR, CHUNK_SIZE, CHUNK_OVERLAP
+# Character classes for PDF validation, counted in C instead of per-character loops
+# (\w is str.isalnum() plus '_', so symbols are "neither alphanumeric nor space")
+_SYMBOL_RE = re.compile(r'[^\w\s]|_')
+_DIGIT_RE = re.compile(r'\d')
+
+# Optional JIT path for ASCII text, used when numba is installed
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _ascii_char_stats(buf):
+        """(symbols, digits) in an ASCII byte buffer; same classes as _SYMBOL_RE and _DIGIT_RE"""
+        symbols = 0
+        digits = 0
+        for c in buf:
+            if 48 <= c <= 57:
+                digits += 1
+            elif not (65 <= c <= 90 or 97 <= c <= 122 or 9 <= c <= 13 or 28 <= c <= 32):
+                symbols += 1
+        return symbols, digits
+else:
+    _ascii_char_stats = None
+
+
+def _char_stats(text):
+    """(symbol count, digit count) for PDF validation"""
+    # Bytes equal characters only for ASCII; anything else keeps the exact Unicode regexes
+    if _ascii_char_stats is not None and text.isascii():
+        return _ascii_char_stats(np.frombuffer(text.encode('ascii'), dtype=np.uint8))
+    return len(_SYMBOL_RE.findall(text)), len(_DIGIT_RE.findall(text))
+
+
+def _keyword_pattern(keywords):
+    """Pattern finding any (lowercase) keyword as a substring of lowercased text, longest first"""
+    alternation = '|'.join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True))
+    return re.compile(f'(?=({alternation}))')
+
+
+def _keyword_counts(pattern, categories, text_lower):
+    """Distinct keywords present per category, from one regex pass over lowercased text"""
+    hits = set(pattern.findall(text_lower))
+    # A longer hit at a position hides shorter keywords it contains ('invoice number' / 'invoice')
+    return {
+        category: sum(1 for kw in keywords if any(kw in hit for hit in hits))
+        for category, keywords in categories.items()
+    }
+
+
+# detect_pdf_type: keywords per document type, counted as distinct matches
+_PDF_TYPE_KEYWORDS = {
+    'ticket': ('boarding pass', 'ticket', 'flight', 'seat', 'gate', 'terminal', 'departure', 'arrival'),
+    'research': ('abstract', 'methodology', 'conclusion', 'references', 'fig.', 'table', 'experiment', 'dataset'),
+    'invoice': ('invoice', 'bill', 'amount due', 'total', 'payment', 'due date', 'invoice number'),
+    'service_info': ('service', 'appointment', 'booking', 'hours', 'contact', 'offer', 'price', 'menu'),
+}
+# One pattern over every type's keywords; hits are attributed back to their types
+_PDF_TYPE_RE = _keyword_pattern({kw for keywords in _PDF_TYPE_KEYWORDS.values() for kw in keywords})
+
+# _get_content_suggestions: topics a good service PDF covers
+_CONTENT_SERVICES_RE = _keyword_pattern(['service', 'appointment', 'booking', 'consultation'])
+_CONTENT_PRICING_RE = _keyword_pattern(['price', 'cost', 'dollar', 'fee', 'charge'])
+_CONTENT_HOURS_RE = _keyword_pattern(['hours', 'open', 'available', 'schedule'])
+_CONTENT_CONTACT_RE = _keyword_pattern(['phone', 'email', 'contact', 'address'])
+
+# get_suggested_questions: (pattern, questions) in display order
+_SUGGESTION_RULES = (
+    (_keyword_pattern(['service', 'offering', 'provide']),
+     ("What services do you offer?", "Tell me about your main services")),
+    (_keyword_pattern(['price', 'cost', 'dollar', 'fee', 'charge', 'pricing']),
+     ("What are your prices?", "How much does [service] cost?")),
+    (_keyword_pattern(['hours', 'open', 'available', 'schedule', 'timing']),
+     ("What are your business hours?", "When are you open?")),
+    (_keyword_pattern(['phone', 'email', 'contact', 'address', 'location']),
+     ("How can I contact you?", "Where are you located?")),
+    (_keyword_pattern(['appointment', 'booking', 'reservation']),
+     ("How do I make an appointment?", "What's your booking process?")),
+    (_keyword_pattern(['policy', 'cancel', 'reschedule', 'refund']),
+     ("What's your cancellation policy?", "Can I reschedule my appointment?")),
+)
+
+
+def _embedding_device() -> str:
+    """Device for the embedding model: EMBEDDING_DEVICE, or the best available when 'auto'"""
+    if EMBEDDING_DEVICE != "auto":
+        return EMBEDDING_DEVICE
+    
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def _build_embeddings():
+    """Embedding model for EMBEDDING_BACKEND; falls back to HuggingFace if fastembed is missing"""
+    if EMBEDDING_BACKEND == "fastembed":
+        try:
+            from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
+            return FastEmbedEmbeddings(
+                model_name=EMBEDDING_MODEL,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                threads=os.cpu_count()
+            )
+        except ImportError:
+            print("⚠️ fastembed is not installed, using HuggingFace embeddings")
+    
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={'device': _embedding_device()},
+        encode_kwargs={'batch_size': EMBEDDING_BATCH_SIZE, 'normalize_embeddings': True}
+    )
+
+
+@st.cache_resource(show_spinner="Loading embedding model...")
+def _get_embeddings():
+    """Shared, warmed-up embedding model"""
+    embeddings = _build_embeddings()
+    
+    # Pay kernel/tokenizer/allocator start-up here rather than on the first real query
+    try:
+        embeddings.embed_query("warmup")
+        embeddings.embed_documents(["warmup"] * 8)
+    except Exception as e:
+        print(f"⚠️ Embedding warmup failed: {e}")
+    
+    return embeddings
+
+
+class _LazyEmbeddings(Embeddings):
+    """Embeddings proxy that loads the shared model on the first embed call"""
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return _get_embeddings().embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return _get_embeddings().embed_query(text)
 
 
 class RAGPipeline:
@@ -18,13 +172,17 @@ class RAGPipeline:
     def __init__(self):
         """Initialize RAG pipeline with embeddings and vector store"""
         try:
-            with st.spinner("Loading embedding model..."):
-                self.embeddings = HuggingFaceEmbeddings(
-                    model_name="sentence-transformers/all-MiniLM-L6-v2",
-                    model_kwargs={'device': 'cpu'}
-                )
+            # The model itself loads on first use (first upload or question), once per process
+            self.embeddings = _LazyEmbeddings()
             
             self.vector_store = None
+            # Stats kept in step with writes, so get_stats never scans the collection
+            self._sources = set()
+            self._chunk_count = 0
+            # LRU of query() results; the version changes whenever the store does
+            self._query_cache = OrderedDict()
+            self._query_lock = threading.Lock()
+            self._store_version = 0
             
             self.text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=CHUNK_SIZE,
@@ -34,51 +192,68 @@ class RAGPipeline:
             )
             
             os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+            # One client for the app's lifetime; it writes through to disk, no persist() needed
+            self._client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
             self._load_vector_store()
             
         except Exception as e:
             st.error(f"Failed to initialize RAG pipeline: {str(e)}")
             raise
     
+    def _new_vector_store(self) -> Chroma:
+        """LangChain wrapper over the persistent collection (created if missing)"""
+        return Chroma(
+            client=self._client,
+            collection_name=CHROMA_COLLECTION,
+            embedding_function=self.embeddings,
+            collection_metadata=CHROMA_HNSW_METADATA
+        )
+    
     def _load_vector_store(self):
         """Load existing vector store if available"""
         try:
-            if os.path.exists(CHROMA_PERSIST_DIR):
-                if os.listdir(CHROMA_PERSIST_DIR):
-                    self.vector_store = Chroma(
-                        persist_directory=CHROMA_PERSIST_DIR,
-                        embedding_function=self.embeddings
-                    )
-                    print("✅ Loaded existing vector store")
+            vector_store = self._new_vector_store()
+            collection = vector_store._collection
+            chunk_count = collection.count()
+            if chunk_count:
+                self.vector_store = vector_store
+                self._chunk_count = chunk_count
+                # One-time metadata read at startup
+                metadatas = collection.get(include=['metadatas'])['metadatas']
+                self._sources = {m['source'] for m in metadatas if m and 'source' in m}
+                print("✅ Loaded existing vector store")
         except Exception as e:
             print(f"⚠️ Could not load existing vector store: {e}")
             self.vector_store = None
     
-    def _validate_pdf_content(self, text: str, filename: str) -> Tuple[bool, str]:
+    def _validate_pdf_content(self, text: str, filename: str, text_lower: str = None) -> Tuple[bool, str]:
         """Validate PDF content quality and relevance"""
         if len(text.strip()) < 100:
             return False, f"❌ '{filename}' has very little text content (less than 100 characters). Please upload PDFs with substantial content."
         
-        non_alpha_ratio = sum(1 for c in text if not c.isalnum() and not c.isspace()) / len(text)
+        symbols, digits = _char_stats(text)
+        
+        non_alpha_ratio = symbols / len(text)
         if non_alpha_ratio > 0.5:
             return False, f"⚠️ '{filename}' appears to have encoding issues or is mostly symbols. Please check the PDF quality."
         
-        digit_ratio = sum(1 for c in text if c.isdigit()) / len(text)
+        digit_ratio = digits / len(text)
         if digit_ratio > 0.7:
             return False, f"⚠️ '{filename}' appears to be mostly numerical data. For best results, upload PDFs with descriptive text content."
         
-        suggestion = self._get_content_suggestions(text)
+        suggestion = self._get_content_suggestions(text, text_lower)
         
         return True, suggestion
     
-    def _get_content_suggestions(self, text: str) -> str:
+    def _get_content_suggestions(self, text: str, text_lower: str = None) -> str:
         """Analyze content and provide suggestions"""
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
-        has_services = any(word in text_lower for word in ['service', 'appointment', 'booking', 'consultation'])
-        has_pricing = any(word in text_lower for word in ['price', 'cost', 'dollar', 'fee', 'charge'])
-        has_hours = any(word in text_lower for word in ['hours', 'open', 'available', 'schedule'])
-        has_contact = any(word in text_lower for word in ['phone', 'email', 'contact', 'address'])
+        has_services = _CONTENT_SERVICES_RE.search(text_lower) is not None
+        has_pricing = _CONTENT_PRICING_RE.search(text_lower) is not None
+        has_hours = _CONTENT_HOURS_RE.search(text_lower) is not None
+        has_contact = _CONTENT_CONTACT_RE.search(text_lower) is not None
         
         suggestions = []
         
@@ -98,6 +273,20 @@ class RAGPipeline:
     
     def extract_text_from_pdf(self, pdf_file) -> Tuple[bool, str]:
         """Extract text from uploaded PDF file with validation"""
+        success, text = self._read_pdf_text(pdf_file)
+        
+        if not success:
+            return False, text
+        
+        is_valid, message = self._validate_pdf_content(text, pdf_file.name)
+        
+        if not is_valid:
+            return False, message
+        
+        return True, text
+    
+    def _read_pdf_text(self, pdf_file) -> Tuple[bool, str]:
+        """Extract the raw text of a PDF; returns (False, error message) on failure"""
         try:
             pdf_reader = PdfReader(pdf_file)
             
@@ -121,19 +310,31 @@ class RAGPipeline:
                     "Please upload PDFs with selectable text."
                 )
             
-            is_valid, message = self._validate_pdf_content(text, pdf_file.name)
-            
-            if not is_valid:
-                return False, message
-            
             return True, text
             
         except Exception as e:
             return False, f"Error reading PDF: {str(e)}"
     
-    def detect_pdf_type(self, text: str) -> dict:
-        """Detect what type of PDF was uploaded"""
+    def _analyze_text(self, text: str, filename: str) -> dict:
+        """Validate, classify and derive suggestions for one PDF's text in a single step"""
+        # Lowercased once here and shared by every keyword check below
         text_lower = text.lower()
+        is_valid, message = self._validate_pdf_content(text, filename, text_lower)
+        
+        if not is_valid:
+            return {'is_valid': False, 'message': message, 'pdf_type': None, 'questions': []}
+        
+        pdf_type = self.detect_pdf_type(text, text_lower)
+        questions = self.get_suggested_questions(text, text_lower) if pdf_type['is_service_info'] else []
+        
+        return {'is_valid': True, 'message': message, 'pdf_type': pdf_type, 'questions': questions}
+    
+    def detect_pdf_type(self, text: str, text_lower: str = None) -> dict:
+        """Detect what type of PDF was uploaded"""
+        if text_lower is None:
+            text_lower = text.lower()
+        
+        counts = _keyword_counts(_PDF_TYPE_RE, _PDF_TYPE_KEYWORDS, text_lower)
         
         pdf_type = {
             'is_service_info': False,
@@ -145,32 +346,28 @@ class RAGPipeline:
         }
         
         # Check for ticket/boarding pass
-        ticket_keywords = ['boarding pass', 'ticket', 'flight', 'seat', 'gate', 'terminal', 'departure', 'arrival']
-        if sum(1 for kw in ticket_keywords if kw in text_lower) >= 3:
+        if counts['ticket'] >= 3:
             pdf_type['is_ticket'] = True
             pdf_type['confidence'] = 'high'
             pdf_type['message'] = "⚠️ This appears to be a ticket/boarding pass, not service information"
             return pdf_type
         
         # Check for research paper
-        research_keywords = ['abstract', 'methodology', 'conclusion', 'references', 'fig.', 'table', 'experiment', 'dataset']
-        if sum(1 for kw in research_keywords if kw in text_lower) >= 4:
+        if counts['research'] >= 4:
             pdf_type['is_research'] = True
             pdf_type['confidence'] = 'high'
             pdf_type['message'] = "⚠️ This appears to be a research paper/academic document, not service information"
             return pdf_type
         
         # Check for invoice
-        invoice_keywords = ['invoice', 'bill', 'amount due', 'total', 'payment', 'due date', 'invoice number']
-        if sum(1 for kw in invoice_keywords if kw in text_lower) >= 3:
+        if counts['invoice'] >= 3:
             pdf_type['is_invoice'] = True
             pdf_type['confidence'] = 'high'
             pdf_type['message'] = "⚠️ This appears to be an invoice/bill, not service information"
             return pdf_type
         
         # Check for service information
-        service_keywords = ['service', 'appointment', 'booking', 'hours', 'contact', 'offer', 'price', 'menu']
-        if sum(1 for kw in service_keywords if kw in text_lower) >= 3:
+        if counts['service_info'] >= 3:
             pdf_type['is_service_info'] = True
             pdf_type['confidence'] = 'high'
             pdf_type['message'] = "✅ This looks like service information - perfect for Q&A!"
@@ -180,43 +377,90 @@ class RAGPipeline:
         pdf_type['message'] = "📄 PDF uploaded, but content type unclear"
         return pdf_type
     
-    def get_suggested_questions(self, pdf_content: str) -> list:
+    def get_suggested_questions(self, pdf_content: str, content_lower: str = None) -> list:
         """Generate suggested questions based on PDF content"""
-        content_lower = pdf_content.lower()
+        if content_lower is None:
+            content_lower = pdf_content.lower()
         
         suggestions = []
         
-        if any(word in content_lower for word in ['service', 'offering', 'provide']):
-            suggestions.append("What services do you offer?")
-            suggestions.append("Tell me about your main services")
+        for pattern, questions in _SUGGESTION_RULES:
+            if pattern.search(content_lower):
+                suggestions.extend(questions)
+        
+        suggestions.append("What should I know before booking?")
+        suggestions.append("Do you have any special offers?")
+        
+        return suggestions[:6]
+    
+    def _postprocess_chunks(self, chunks: List[str]) -> List[str]:
+        """Merge runs of short chunks and re-split any that came out oversized"""
+        max_len = int(CHUNK_SIZE * 1.1)
+        min_len = CHUNK_SIZE // 2
+        
+        merged = []
+        for chunk in chunks:
+            if len(chunk) > max_len:
+                merged.extend(self.text_splitter.split_text(chunk))
+            elif merged and len(merged[-1]) < min_len and len(merged[-1]) + 1 + len(chunk) <= max_len:
+                merged[-1] = merged[-1] + "\n" + chunk
+            else:
+                merged.append(chunk)
         
-        if any(word in content_lower for word in ['price', 'cost', 'dollar', 'fee', 'charge', 'pricing']):
-            suggestions.append("What are your prices?")
-            suggestions.append("How much does [service] cost?")
+        return merged
+    
+    def _prepare_pdf(self, pdf_file) -> dict:
+        """Read, analyze and chunk one PDF; safe to run in a worker thread (no Streamlit calls)"""
+        result = {'name': pdf_file.name, 'error': None, 'warnings': [], 'questions': [], 'documents': []}
         
-        if any(word in content_lower for word in ['hours', 'open', 'available', 'schedule', 'timing']):
-            suggestions.append("What are your business hours?")
-            suggestions.append("When are you open?")
+        success, text = self._read_pdf_text(pdf_file)
         
-        if any(word in content_lower for word in ['phone', 'email', 'contact', 'address', 'location']):
-            suggestions.append("How can I contact you?")
-            suggestions.append("Where are you located?")
+        if not success:
+            result['error'] = text
+            return result
         
-        if any(word in content_lower for word in ['appointment', 'booking', 'reservation']):
-            suggestions.append("How do I make an appointment?")
-            suggestions.append("What's your booking process?")
+        analysis = self._analyze_text(text, pdf_file.name)
         
-        if any(word in content_lower for word in ['policy', 'cancel', 'reschedule', 'refund']):
-            suggestions.append("What's your cancellation policy?")
-            suggestions.append("Can I reschedule my appointment?")
+        if not analysis['is_valid']:
+            result['error'] = analysis['message']
+            return result
         
-        suggestions.append("What should I know before booking?")
-        suggestions.append("Do you have any special offers?")
+        pdf_type_info = analysis['pdf_type']
         
-        return suggestions[:6]
+        if pdf_type_info['is_ticket'] or pdf_type_info['is_research'] or pdf_type_info['is_invoice']:
+            result['warnings'].append(f"⚠️ {pdf_file.name}: {pdf_type_info['message']}")
+        
+        if "Consider including" in analysis['message']:
+            result['warnings'].append(f"📝 {pdf_file.name}: {analysis['message']}")
+        
+        result['questions'] = analysis['questions']
+        
+        chunks = self._postprocess_chunks(self.text_splitter.split_text(text))
+        
+        if not chunks:
+            result['error'] = "No text chunks created"
+            return result
+        
+        result['documents'] = [
+            Document(
+                page_content=chunk,
+                metadata={
+                    "source": pdf_file.name,
+                    "chunk_id": idx,
+                    "total_chunks": len(chunks)
+                }
+            )
+            for idx, chunk in enumerate(chunks)
+        ]
+        
+        return result
     
-    def process_pdfs(self, pdf_files: List) -> Tuple[bool, str]:
-        """Process PDFs with type detection and question suggestions"""
+    def process_pdfs(self, pdf_files: List, batch_size: int = INGEST_BATCH_SIZE, progress=None) -> Tuple[bool, str]:
+        """Process PDFs with type detection and question suggestions
+
+        Chunks from all files are embedded and stored together, batch_size at a time;
+        progress(done, total) is called after each batch if given.
+        """
         if not pdf_files:
             return False, "No PDF files provided"
         
@@ -227,48 +471,20 @@ class RAGPipeline:
             warnings = []
             all_suggestions = []
             
-            for pdf_file in pdf_files:
-                success, result = self.extract_text_from_pdf(pdf_file)
-                
-                if not success:
-                    failed_files.append(f"❌ {pdf_file.name}: {result}")
-                    continue
-                
-                text = result
-                
-                pdf_type_info = self.detect_pdf_type(text)
-                
-                if pdf_type_info['is_ticket'] or pdf_type_info['is_research'] or pdf_type_info['is_invoice']:
-                    warnings.append(f"⚠️ {pdf_file.name}: {pdf_type_info['message']}")
-                
-                _, suggestion = self._validate_pdf_content(text, pdf_file.name)
-                if "Consider including" in suggestion:
-                    warnings.append(f"📝 {pdf_file.name}: {suggestion}")
-                
-                if pdf_type_info['is_service_info']:
-                    questions = self.get_suggested_questions(text)
-                    all_suggestions.extend(questions)
-                
-                chunks = self.text_splitter.split_text(text)
+            # Files are read, analyzed and chunked in parallel; results come back in upload order
+            with ThreadPoolExecutor(max_workers=min(PDF_WORKERS, len(pdf_files))) as executor:
+                prepared = list(executor.map(self._prepare_pdf, pdf_files))
+            
+            for result in prepared:
+                warnings.extend(result['warnings'])
+                all_suggestions.extend(result['questions'])
                 
-                if not chunks:
-                    failed_files.append(f"❌ {pdf_file.name}: No text chunks created")
+                if result['error']:
+                    failed_files.append(f"❌ {result['name']}: {result['error']}")
                     continue
                 
-                documents = [
-                    Document(
-                        page_content=chunk,
-                        metadata={
-                            "source": pdf_file.name,
-                            "chunk_id": idx,
-                            "total_chunks": len(chunks)
-                        }
-                    )
-                    for idx, chunk in enumerate(chunks)
-                ]
-                
-                all_documents.extend(documents)
-                processed_files.append(pdf_file.name)
+                all_documents.extend(result['documents'])
+                processed_files.append(result['name'])
             
             if not all_documents:
                 error_msg = "❌ Failed to process any PDFs.\n\n"
@@ -279,19 +495,27 @@ class RAGPipeline:
                 error_msg += "**Avoid:**\n✗ Tickets/boarding passes\n✗ Research papers\n✗ Invoices/bills\n✗ Scanned images"
                 return False, error_msg
             
+            # Start from an empty store so every write goes through the same batched add
             if self.vector_store is None:
-                self.vector_store = Chroma.from_documents(
-                    documents=all_documents,
-                    embedding=self.embeddings,
-                    persist_directory=CHROMA_PERSIST_DIR
-                )
-            else:
-                self.vector_store.add_documents(all_documents)
+                self.vector_store = self._new_vector_store()
             
-            self.vector_store.persist()
+            # Embed and store in batches so callers can report progress
+            total = len(all_documents)
+            for start in range(0, total, batch_size):
+                self.vector_store.add_documents(all_documents[start:start + batch_size])
+                
+                if progress:
+                    progress(min(start + batch_size, total), total)
+            
+            self._sources.update(processed_files)
+            self._chunk_count += total
+            self._store_version += 1
             
             if all_suggestions:
-                st.session_state.pdf_suggestions = list(set(all_suggestions))[:6]
+                # (question, widget key) pairs; keys are built once here, not on every rerun
+                st.session_state.pdf_suggestions = [
+                    (q, f"suggest_{i}") for i, q in enumerate(list(set(all_suggestions))[:6])
+                ]
             
             success_msg = f"✅ **Successfully processed {len(processed_files)}/{len(pdf_files)} PDF(s)**\n\n"
             success_msg += f"📊 **Chunks created:** {len(all_documents)}\n\n"
@@ -328,18 +552,21 @@ class RAGPipeline:
             if self.vector_store is None:
                 return ""
             
-            docs = self.vector_store.similarity_search(question, k=k)
+            # The embedding model is uncased, so case and surrounding space don't change results
+            key = (question.strip().lower(), k, self._store_version)
+            with self._query_lock:
+                if key in self._query_cache:
+                    self._query_cache.move_to_end(key)
+                    return self._query_cache[key]
             
-            if not docs:
-                return ""
+            docs = self.vector_store.similarity_search(question, k=k)
             
-            context_parts = []
-            for doc in docs:
-                source = doc.metadata.get('source', 'Unknown')
-                content = doc.page_content.strip()
-                context_parts.append(f"[Source: {source}]\n{content}")
+            context = self._format_context(docs) if docs else ""
             
-            context = "\n\n---\n\n".join(context_parts)
+            with self._query_lock:
+                self._query_cache[key] = context
+                if len(self._query_cache) > QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
             
             return context
         
@@ -347,6 +574,20 @@ class RAGPipeline:
             print(f"Error querying documents: {str(e)}")
             return ""
     
+    def _format_context(self, docs) -> str:
+        """Join retrieved chunks into one context string with their sources"""
+        context_parts = []
+        for doc in docs:
+            source = doc.metadata.get('source', 'Unknown')
+            content = doc.page_content.strip()
+            context_parts.append(f"[Source: {source}]\n{content}")
+        
+        return "\n\n---\n\n".join(context_parts)
+    
+    async def aquery(self, question: str, k: int = 4) -> str:
+        """Async query; the embedding and vector search run in a worker thread"""
+        return await asyncio.to_thread(self.query, question, k)
+    
     def get_relevant_docs(self, question: str, k: int = 4):
         """Get relevant documents with metadata"""
         try:
@@ -363,51 +604,39 @@ class RAGPipeline:
     def clear_vector_store(self) -> Tuple[bool, str]:
         """Clear the vector store and delete all stored documents"""
         try:
-            if os.path.exists(CHROMA_PERSIST_DIR):
-                import shutil
-                shutil.rmtree(CHROMA_PERSIST_DIR)
-                os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+            # Drop the collection through the client; deleting its files underneath would break it
+            if CHROMA_COLLECTION in self._collection_names():
+                self._client.delete_collection(CHROMA_COLLECTION)
             
             self.vector_store = None
+            self._sources = set()
+            self._chunk_count = 0
+            self._store_version += 1
             
             # Clear suggestions
-            if hasattr(st.session_state, 'pdf_suggestions'):
-                delattr(st.session_state, 'pdf_suggestions')
+            st.session_state.pop('pdf_suggestions', None)
             
             return True, "✅ All documents cleared successfully"
         
         except Exception as e:
             return False, f"❌ Error clearing documents: {str(e)}"
     
+    def _collection_names(self) -> set:
+        """Names of the collections in the persistent store"""
+        # Chroma < 0.6 returns Collection objects, newer versions return names
+        return {getattr(c, 'name', c) for c in self._client.list_collections()}
+    
     def get_stats(self) -> dict:
         """Get statistics about the vector store"""
-        try:
-            if self.vector_store is None:
-                return {
-                    "total_chunks": 0,
-                    "sources": [],
-                    "is_ready": False
-                }
-            
-            collection = self.vector_store._collection
-            all_docs = collection.get()
-            
-            sources = set()
-            if all_docs and 'metadatas' in all_docs:
-                for metadata in all_docs['metadatas']:
-                    if metadata and 'source' in metadata:
-                        sources.add(metadata['source'])
-            
-            return {
-                "total_chunks": len(all_docs['ids']) if all_docs and 'ids' in all_docs else 0,
-                "sources": list(sources),
-                "is_ready": True
-            }
-        
-        except Exception as e:
-            print(f"Error getting stats: {str(e)}")
+        if self.vector_store is None:
             return {
                 "total_chunks": 0,
                 "sources": [],
                 "is_ready": False
-            }
\ No newline at end of file
+            }
+        
+        return {
+            "total_chunks": self._chunk_count,
+            "sources": sorted(self._sources),
+            "is_ready": True
+        }
@@ -0,0 +1,9 @@
+import streamlit as st
+from app.config import SQLITE_DB_PATH
+from db.database import BookingDatabase
+
+
+@st.cache_resource
+def get_db():
+    """Shared BookingDatabase instance, created once per process"""
+    return BookingDatabase(SQLITE_DB_PATH)
@@ -1,81 +1,60 @@
-import os
+import re
 import smtplib
-import streamlit as st
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from string import Template
+from email.charset import Charset, QP
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from app import config
+from app.config import EMAIL_RE
 
+# Formatting characters removed before a phone number is checked
+_PHONE_STRIP_RE = re.compile(r'[\s\-\(\)\+]')
+_DATE_FMT = '%Y-%m-%d'
+_TIME_FMT = '%H:%M'
 
-def send_booking_email(booking_data, booking_id):
-    """
-    Send booking confirmation email
-    
-    Args:
-        booking_data: Dictionary containing booking information
-        booking_id: The booking ID from database
-        
-    Returns:
-        bool: True if email sent successfully, False otherwise
-    """
-    try:
-        # Get email credentials from Streamlit secrets or environment
-        if hasattr(st, 'secrets'):
-            smtp_server = st.secrets.get("SMTP_SERVER", "smtp.gmail.com")
-            smtp_port = st.secrets.get("SMTP_PORT", 587)
-            sender_email = st.secrets.get("SENDER_EMAIL", "")
-            sender_password = st.secrets.get("SENDER_PASSWORD", "")
-        else:
-            smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-            smtp_port = int(os.getenv("SMTP_PORT", "587"))
-            sender_email = os.getenv("SENDER_EMAIL", "")
-            sender_password = os.getenv("SENDER_PASSWORD", "")
-        
-        # Check if email credentials are configured
-        if not sender_email or not sender_password:
-            print("Email credentials not configured. Skipping email send.")
-            return False
-        
-        # Recipient email
-        recipient_email = booking_data.get('email')
-        
-        if not recipient_email:
-            print("No recipient email found")
-            return False
-        
-        # Create message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = f"Booking Confirmation - ID: {booking_id}"
-        message["From"] = sender_email
-        message["To"] = recipient_email
-        
-        # Create email body
-        text_content = f"""
+# Confirmation emails are sent off the request path so SMTP latency never blocks a rerun
+_EMAIL_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="booking-email")
+
+# Bodies are mostly ASCII, so quoted-printable is far smaller on the wire than base64
+_UTF8_QP = Charset('utf-8')
+_UTF8_QP.body_encoding = QP
+
+# Booking fields shown in the confirmation email ('N/A' when missing)
+_EMAIL_FIELDS = ('name', 'email', 'phone', 'booking_type', 'date', 'time')
+
+# Email bodies, parsed once; filled with the booking fields plus customer_name and booking_id
+_TEXT_TEMPLATE = Template("""
 Booking Confirmation
 
-Dear {booking_data.get('name', 'Customer')},
+Dear ${customer_name},
 
 Thank you for your booking! Here are your booking details:
 
-Booking ID: {booking_id}
-Name: {booking_data.get('name', 'N/A')}
-Email: {booking_data.get('email', 'N/A')}
-Phone: {booking_data.get('phone', 'N/A')}
-Service Type: {booking_data.get('booking_type', 'N/A')}
-Date: {booking_data.get('date', 'N/A')}
-Time: {booking_data.get('time', 'N/A')}
+Booking ID: ${booking_id}
+Name: ${name}
+Email: ${email}
+Phone: ${phone}
+Service Type: ${booking_type}
+Date: ${date}
+Time: ${time}
 
 If you need to make any changes or have questions, please contact us.
 
 Best regards,
 AI Booking Assistant Team
-"""
-        
-        html_content = f"""
+""")
+
+_HTML_TEMPLATE = Template("""
 <html>
   <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
     <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #ddd; border-radius: 10px;">
       <h2 style="color: #4CAF50; text-align: center;">✅ Booking Confirmation</h2>
       
-      <p>Dear <strong>{booking_data.get('name', 'Customer')}</strong>,</p>
+      <p>Dear <strong>${customer_name}</strong>,</p>
       
       <p>Thank you for your booking! Here are your booking details:</p>
       
@@ -83,31 +62,31 @@ AI Booking Assistant Team
         <table style="width: 100%; border-collapse: collapse;">
           <tr>
             <td style="padding: 8px; font-weight: bold;">Booking ID:</td>
-            <td style="padding: 8px;">{booking_id}</td>
+            <td style="padding: 8px;">${booking_id}</td>
           </tr>
           <tr style="background-color: #fff;">
             <td style="padding: 8px; font-weight: bold;">Name:</td>
-            <td style="padding: 8px;">{booking_data.get('name', 'N/A')}</td>
+            <td style="padding: 8px;">${name}</td>
           </tr>
           <tr>
             <td style="padding: 8px; font-weight: bold;">Email:</td>
-            <td style="padding: 8px;">{booking_data.get('email', 'N/A')}</td>
+            <td style="padding: 8px;">${email}</td>
           </tr>
           <tr style="background-color: #fff;">
             <td style="padding: 8px; font-weight: bold;">Phone:</td>
-            <td style="padding: 8px;">{booking_data.get('phone', 'N/A')}</td>
+            <td style="padding: 8px;">${phone}</td>
           </tr>
           <tr>
             <td style="padding: 8px; font-weight: bold;">Service Type:</td>
-            <td style="padding: 8px;">{booking_data.get('booking_type', 'N/A')}</td>
+            <td style="padding: 8px;">${booking_type}</td>
           </tr>
           <tr style="background-color: #fff;">
             <td style="padding: 8px; font-weight: bold;">Date:</td>
-            <td style="padding: 8px;">{booking_data.get('date', 'N/A')}</td>
+            <td style="padding: 8px;">${date}</td>
           </tr>
           <tr>
             <td style="padding: 8px; font-weight: bold;">Time:</td>
-            <td style="padding: 8px;">{booking_data.get('time', 'N/A')}</td>
+            <td style="padding: 8px;">${time}</td>
           </tr>
         </table>
       </div>
@@ -125,20 +104,128 @@ AI Booking Assistant Team
     </div>
   </body>
 </html>
-"""
+""")
+
+# One long-lived SMTP session shared by the email workers; guarded by _SMTP_LOCK
+_SMTP_LOCK = threading.Lock()
+_smtp_conn = None
+
+
+def _smtp_connection(smtp_server, smtp_port, sender_email, sender_password):
+    """Return the open SMTP session, reconnecting if it has gone stale (call with _SMTP_LOCK held)"""
+    global _smtp_conn
+    
+    if _smtp_conn is not None:
+        try:
+            if _smtp_conn.noop()[0] == 250:
+                return _smtp_conn
+        except (smtplib.SMTPException, OSError):
+            pass
+        _close_smtp()
+    
+    server = smtplib.SMTP(smtp_server, smtp_port, timeout=30)
+    try:
+        server.starttls()  # Secure the connection
+        server.login(sender_email, sender_password)
+    except Exception:
+        # Don't leak the socket of a half-open session
+        server.close()
+        raise
+    _smtp_conn = server
+    return server
+
+
+def _close_smtp():
+    """Drop the shared SMTP session (call with _SMTP_LOCK held)"""
+    global _smtp_conn
+    
+    if _smtp_conn is not None:
+        try:
+            _smtp_conn.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        _smtp_conn = None
+
+
+def send_booking_email(booking_data, booking_id):
+    """
+    Queue a booking confirmation email; SMTP runs on a background thread
+    
+    Args:
+        booking_data: Dictionary containing booking information
+        booking_id: The booking ID from database
+        
+    Returns:
+        Future: resolves to True once delivered or False when every attempt failed;
+        None if the email cannot be sent
+    """
+    try:
+        # Check if email credentials are configured (secrets/env, read once per process)
+        if not config.sender_email() or not config.sender_password():
+            print("Email credentials not configured. Skipping email send.")
+            return None
         
-        # Attach both plain text and HTML versions
-        part1 = MIMEText(text_content, "plain")
-        part2 = MIMEText(html_content, "html")
+        # Recipient email
+        recipient_email = booking_data.get('email')
+        
+        if not recipient_email:
+            print("No recipient email found")
+            return None
         
-        message.attach(part1)
-        message.attach(part2)
+        # Copy the booking so later edits in the session can't change the queued email
+        return _EMAIL_POOL.submit(
+            _send_booking_email_sync,
+            dict(booking_data), booking_id,
+            config.smtp_server(), config.smtp_port(), config.sender_email(), config.sender_password()
+        )
+        
+    except Exception as e:
+        print(f"Error queueing email: {str(e)}")
+        return None
+
+
+def _send_booking_email_sync(booking_data, booking_id, smtp_server, smtp_port, sender_email, sender_password):
+    """Build and send the confirmation email; runs on the email worker pool"""
+    try:
+        recipient_email = booking_data['email']
+        
+        # Fill the precompiled bodies
+        context = {field: booking_data.get(field, 'N/A') for field in _EMAIL_FIELDS}
+        context['customer_name'] = booking_data.get('name', 'Customer')
+        context['booking_id'] = booking_id
+        text_part = MIMEText(_TEXT_TEMPLATE.safe_substitute(context), "plain", _UTF8_QP)
+        
+        # Create message: plain text and HTML versions, or plain text alone
+        if config.EMAIL_HTML_ENABLED:
+            message = MIMEMultipart("alternative")
+            message.attach(text_part)
+            message.attach(MIMEText(_HTML_TEMPLATE.safe_substitute(context), "html", _UTF8_QP))
+        else:
+            message = text_part
+        
+        message["Subject"] = f"Booking Confirmation - ID: {booking_id}"
+        message["From"] = sender_email
+        message["To"] = recipient_email
         
-        # Send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()  # Secure the connection
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, recipient_email, message.as_string())
+        # Send over the shared connection, backing off between attempts; a failed
+        # session is dropped so the next attempt reconnects
+        payload = message.as_string()
+        delay = config.EMAIL_RETRY_BACKOFF
+        for attempt in range(1, config.EMAIL_SEND_ATTEMPTS + 1):
+            try:
+                with _SMTP_LOCK:
+                    _smtp_connection(smtp_server, smtp_port, sender_email, sender_password).sendmail(
+                        sender_email, recipient_email, payload
+                    )
+                break
+            except (smtplib.SMTPException, OSError) as e:
+                with _SMTP_LOCK:
+                    _close_smtp()
+                if attempt == config.EMAIL_SEND_ATTEMPTS:
+                    raise
+                print(f"Email attempt {attempt} failed ({e}); retrying in {delay}s")
+                time.sleep(delay)
+                delay *= 2
         
         print(f"Email sent successfully to {recipient_email}")
         return True
@@ -158,9 +245,7 @@ def validate_email_format(email):
     Returns:
         bool: True if valid, False otherwise
     """
-    import re
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_RE.match(email) is not None
 
 
 def validate_phone_format(phone):
@@ -173,9 +258,8 @@ def validate_phone_format(phone):
     Returns:
         bool: True if valid, False otherwise
     """
-    import re
     # Remove common formatting characters
-    cleaned = re.sub(r'[\s\-\(\)\+]', '', phone)
+    cleaned = _PHONE_STRIP_RE.sub('', phone)
     # Check if it contains only digits and has reasonable length
     return cleaned.isdigit() and 10 <= len(cleaned) <= 15
 
@@ -190,9 +274,8 @@ def validate_date_format(date_str):
     Returns:
         bool: True if valid, False otherwise
     """
-    from datetime import datetime
     try:
-        datetime.strptime(date_str, '%Y-%m-%d')
+        datetime.strptime(date_str, _DATE_FMT)
         return True
     except ValueError:
         return False
@@ -208,9 +291,8 @@ def validate_time_format(time_str):
     Returns:
         bool: True if valid, False otherwise
     """
-    from datetime import datetime
     try:
-        datetime.strptime(time_str, '%H:%M')
+        datetime.strptime(time_str, _TIME_FMT)
         return True
     except ValueError:
         return False
\ No newline at end of file
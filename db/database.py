@@ -1,8 +1,251 @@
+import atexit
+import json
 import sqlite3
 import os
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+# Faster JSON export when orjson is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# WAL lets dashboard reads run alongside booking writes; with WAL, NORMAL sync
+# is still crash-safe and skips the fsync on every commit
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+# Bookings carry a copy of their customer's name, email and phone so reads
+# skip the join; this keeps the copies current when a customer changes, and
+# only then, so a no-op update doesn't rewrite every booking (and its FTS row)
+_CUSTOMER_SYNC_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS customers_bookings_sync AFTER UPDATE OF name, email, phone ON customers
+    WHEN old.name IS NOT new.name OR old.email IS NOT new.email OR old.phone IS NOT new.phone
+    BEGIN
+        UPDATE bookings SET name = new.name, email = new.email, phone = new.phone
+        WHERE customer_id = new.customer_id;
+    END
+"""
+
+# Triggers that read customers directly, from before bookings had the copies
+_LEGACY_TRIGGERS = ("bookings_fts_insert", "bookings_fts_update", "customers_fts_update")
+
+# Keep bookings_fts (rowid = bookings.id) in step with bookings; customer
+# changes reach it through customers_bookings_sync
+_SEARCH_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS bookings_fts_insert AFTER INSERT ON bookings BEGIN
+        INSERT INTO bookings_fts (rowid, name, email, date)
+        VALUES (new.id, new.name, new.email, new.date);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookings_fts_delete AFTER DELETE ON bookings BEGIN
+        DELETE FROM bookings_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookings_fts_update AFTER UPDATE OF name, email, date ON bookings BEGIN
+        DELETE FROM bookings_fts WHERE rowid = old.id;
+        INSERT INTO bookings_fts (rowid, name, email, date)
+        VALUES (new.id, new.name, new.email, new.date);
+    END
+    """,
+)
+
+
+def _fts_prefix_query(search_term):
+    """FTS5 MATCH expression: the term as a phrase whose last token is a prefix; None if it has no words"""
+    if not any(ch.isalnum() for ch in search_term):
+        return None
+    return '"' + search_term.replace('"', '""') + '"*'
+
+
+# INSERT ... RETURNING needs SQLite 3.35+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Customers remembered by email so repeat bookings skip the lookup
+CUSTOMER_CACHE_SIZE = 1024
+
+# Read-only connections opened on demand for dashboard queries; WAL lets them
+# read alongside the single writer connection
+READ_POOL_SIZE = 8
+
+# Every booking query returns these columns, customer details included
+_BOOKING_SELECT = """
+    SELECT
+        b.id,
+        b.name,
+        b.email,
+        b.phone,
+        b.booking_type,
+        b.date,
+        b.time,
+        b.status,
+        b.created_at
+    FROM bookings b
+"""
+
+# Customer and booking writes
+_SQL_FIND_CUSTOMER = "SELECT customer_id, name, phone FROM customers WHERE email = ?"
+
+# Returns no row when the customer exists with the same details (nothing is
+# written); _save_customers then looks the id up instead
+_SQL_UPSERT_CUSTOMER = """
+    INSERT INTO customers (name, email, phone)
+    VALUES (?, ?, ?)
+    ON CONFLICT(email) DO UPDATE SET name = excluded.name, phone = excluded.phone
+    WHERE name IS NOT excluded.name OR phone IS NOT excluded.phone
+    RETURNING customer_id
+"""
+
+# Fallback for SQLite builds older than 3.35 (no RETURNING)
+_SQL_UPDATE_CUSTOMER = """
+    UPDATE customers
+    SET name = ?, phone = ?
+    WHERE customer_id = ?
+"""
+
+_SQL_INSERT_CUSTOMER = """
+    INSERT INTO customers (name, email, phone)
+    VALUES (?, ?, ?)
+"""
+
+_SQL_INSERT_BOOKING = """
+    INSERT INTO bookings (customer_id, name, email, phone, booking_type, date, time, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Same insert, handing back the new id with the write itself
+_SQL_INSERT_BOOKING_RETURNING = _SQL_INSERT_BOOKING + "RETURNING id\n"
+
+# Multi-row INSERT for import_bookings; SQLite before 3.32 allows only 999
+# bound parameters per statement (8 per booking)
+IMPORT_BATCH_SIZE = 500 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999 // 8
+_SQL_IMPORT_BOOKINGS = """
+    INSERT INTO bookings (customer_id, name, email, phone, booking_type, date, time, status)
+    VALUES """
+
+_SQL_UPDATE_STATUS = """
+    UPDATE bookings
+    SET status = ?
+    WHERE id = ?
+"""
+
+_SQL_DELETE_BOOKING = "DELETE FROM bookings WHERE id = ?"
+
+# Booking lists
+_SQL_ALL_BOOKINGS = _BOOKING_SELECT + """
+    ORDER BY b.created_at DESC, b.id DESC
+"""
+
+_SQL_BOOKING_BY_ID = _BOOKING_SELECT + """
+    WHERE b.id = ?
+"""
+
+_SQL_SEARCH_LIKE = _BOOKING_SELECT + """
+    WHERE b.name LIKE :pattern OR b.email LIKE :pattern OR b.date LIKE :pattern
+    ORDER BY b.created_at DESC, b.id DESC
+"""
+
+_SQL_BOOKINGS_BY_DATE = _BOOKING_SELECT + """
+    WHERE b.date = ?
+    ORDER BY b.time
+"""
+
+_SQL_CUSTOMER_BOOKINGS = _BOOKING_SELECT + """
+    WHERE b.email = ?
+    ORDER BY b.date DESC, b.time DESC
+"""
+
+# Word-prefix matches from the FTS index, most relevant first; unlike
+# _SQL_SEARCH_LIKE this never scans bookings
+_SQL_SEARCH_FTS = _BOOKING_SELECT + """
+    JOIN (
+        SELECT rowid AS id, rank FROM bookings_fts WHERE bookings_fts MATCH :match
+    ) f ON f.id = b.id
+    ORDER BY f.rank, b.created_at DESC, b.id DESC
+"""
+
+# Appended to the booking lists above to fetch a single page
+_SQL_PAGE = " LIMIT ? OFFSET ?"
+_SQL_PAGE_NAMED = " LIMIT :limit OFFSET :offset"
+
+# Dashboard statistics: every count in one pass, tagged by bucket
+_SQL_BOOKING_COUNTS = """
+    SELECT 'status' AS bucket, status AS key, COUNT(*) AS count
+    FROM bookings
+    GROUP BY status
+    UNION ALL
+    SELECT 'type', booking_type, COUNT(*)
+    FROM bookings
+    GROUP BY booking_type
+    UNION ALL
+    SELECT 'customers', NULL, COUNT(DISTINCT customer_id)
+    FROM bookings
+    ORDER BY count DESC
+"""
+
+# Recent and upcoming dashboard lists in one statement; each list is limited
+# first (an index scan), then numbered so pos keeps its order
+_SQL_DASHBOARD_BOOKINGS = """
+    WITH recent AS (
+        SELECT b.id, b.name, b.booking_type, b.date, b.time, b.status, b.created_at
+        FROM bookings b
+        ORDER BY b.created_at DESC, b.id DESC
+        LIMIT 5
+    ),
+    upcoming AS (
+        SELECT b.id, b.name, b.booking_type, b.date, b.time
+        FROM bookings b
+        WHERE b.date >= ?
+        ORDER BY b.date, b.time, b.id
+        LIMIT 50
+    )
+    SELECT 'recent' AS bucket, id, name, booking_type, date, time, status,
+           ROW_NUMBER() OVER (ORDER BY created_at DESC, id DESC) AS pos
+    FROM recent
+    UNION ALL
+    SELECT 'upcoming', id, name, booking_type, date, time, NULL,
+           ROW_NUMBER() OVER (ORDER BY date, time, id)
+    FROM upcoming
+    ORDER BY bucket, pos
+"""
+
+# Columns shown in the dashboard's recent and upcoming tables
+_RECENT_COLUMNS = ('id', 'name', 'booking_type', 'date', 'time', 'status')
+_UPCOMING_COLUMNS = ('id', 'name', 'booking_type', 'date', 'time')
+
+# Filterable columns and their DISTINCT queries
+_SQL_DISTINCT = {
+    column: f"SELECT DISTINCT {column} FROM bookings ORDER BY {column}"
+    for column in ('status', 'booking_type', 'date')
+}
+
+
+def _rows_to_dicts(rows):
+    """Convert sqlite3.Row results (a cursor or a fetched list) to plain dicts"""
+    return [dict(row) for row in rows]
+
+
+def _json_bytes(rows):
+    """Serialize booking dicts to compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(rows)
+    return json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
 
 class BookingDatabase:
     """Database handler for bookings and customers"""
@@ -11,363 +254,584 @@ class BookingDatabase:
         """Initialize database connection"""
         self.db_path = db_path
         
-        # Ensure db directory exists
-        Path(os.path.dirname(db_path)).mkdir(parents=True, exist_ok=True)
+        # ":memory:" and "file:" URIs (e.g. "file::memory:?cache=shared" for tests)
+        # have no directory to create
+        self._uri = db_path.startswith("file:")
+        if not (self._uri or db_path.startswith(":")):
+            # Ensure db directory exists
+            Path(os.path.dirname(db_path)).mkdir(parents=True, exist_ok=True)
+        
+        # One writer connection for the life of the process; Streamlit reruns on
+        # many threads, so writes are serialized through the lock in _connection()
+        self._conn = self._open_connection()
+        self._lock = threading.RLock()
+        
+        # Readers are borrowed from a pool; in-memory databases have no WAL (and a
+        # private one can't be shared at all), so there reads go through the writer too
+        in_memory = ":memory:" in db_path or "mode=memory" in db_path
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._pool_lock = threading.Lock()
+        self._pool_size = 0 if in_memory else READ_POOL_SIZE
+        
+        # email -> (customer_id, name, phone) as last committed, most recent last
+        self._customer_cache = OrderedDict()
+        
+        # Bumped after every committed write through this instance; callers
+        # key their own caches on it (app.resources.get_db() shares one
+        # instance per process)
+        self.write_version = 0
         
         # Initialize database
         self._create_tables()
     
-    def _get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
+    def _open_connection(self, read_only=False):
+        """Open a connection with the shared settings, closed at interpreter exit"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256, uri=self._uri)
         conn.row_factory = sqlite3.Row  # Enable column access by name
+        
+        # Connection-level settings, applied once since connections are reused
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if read_only:
+            conn.execute("PRAGMA query_only=1")
+        
+        atexit.register(conn.close)
         return conn
     
+    @contextmanager
+    def _connection(self):
+        """Hold the writer connection for one operation"""
+        with self._lock:
+            yield self._conn
+    
+    @contextmanager
+    def _read_connection(self):
+        """Borrow a read-only connection from the pool for one operation"""
+        if not self._pool_size:
+            with self._connection() as conn:
+                yield conn
+            return
+        
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                create = self._reader_count < self._pool_size
+                if create:
+                    self._reader_count += 1
+            
+            if create:
+                try:
+                    conn = self._open_connection(read_only=True)
+                except Exception:
+                    with self._pool_lock:
+                        self._reader_count -= 1
+                    raise
+            else:
+                # Pool exhausted; wait for another thread to return one
+                conn = self._readers.get()
+        
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
     def _create_tables(self):
         """Create necessary tables if they don't exist"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            with conn:
+                # Create customers table
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS customers (
+                        customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT NOT NULL,
+                        email TEXT NOT NULL UNIQUE,
+                        phone TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                
+                # Create bookings table
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS bookings (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        customer_id INTEGER NOT NULL,
+                        name TEXT,
+                        email TEXT,
+                        phone TEXT,
+                        booking_type TEXT NOT NULL,
+                        date TEXT NOT NULL,
+                        time TEXT NOT NULL,
+                        status TEXT DEFAULT 'confirmed',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
+                    )
+                """)
+                
+                self._add_customer_columns(cursor)
+                # Recreated so a trigger from before its WHEN clause is replaced
+                cursor.execute("DROP TRIGGER IF EXISTS customers_bookings_sync")
+                cursor.execute(_CUSTOMER_SYNC_TRIGGER)
+                
+                # Indexes for the dashboard filters and the created_at/date orderings
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings(status)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_type ON bookings(booking_type)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings(date)")
+                # Covers the id tiebreaker too, so a LIMITed page stops after `limit` rows
+                # without a sort step; replaces the older created_at-only index
+                cursor.execute("DROP INDEX IF EXISTS idx_bookings_created_at")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_created_at_id ON bookings(created_at DESC, id DESC)")
+                # Customer sync updates and per-customer lookups
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_customer_id ON bookings(customer_id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_email ON bookings(email)")
+                
+                self._fts = self._create_search_index(cursor)
+            
+            # Refresh planner statistics so the indexes above are actually chosen
+            cursor.execute("ANALYZE")
+    
+    def _add_customer_columns(self, cursor):
+        """Add and fill the customer copies on a bookings table created before they existed"""
+        cursor.execute("PRAGMA table_info(bookings)")
+        if 'email' in {row['name'] for row in cursor.fetchall()}:
+            return
+        
+        for column in ('name', 'email', 'phone'):
+            cursor.execute(f"ALTER TABLE bookings ADD COLUMN {column} TEXT")
+        
+        # Recreated by _create_search_index to read the new columns
+        for trigger in _LEGACY_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        
+        cursor.execute("""
+            UPDATE bookings SET (name, email, phone) = (
+                SELECT c.name, c.email, c.phone FROM customers c
+                WHERE c.customer_id = bookings.customer_id
+            )
+        """)
+    
+    def _create_search_index(self, cursor):
+        """Create the FTS5 index behind search_bookings; False if this SQLite lacks FTS5"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bookings_fts'")
+        exists = cursor.fetchone() is not None
         
         try:
-            # Create customers table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS customers (
-                    customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    email TEXT NOT NULL UNIQUE,
-                    phone TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create bookings table
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts USING fts5(name, email, date)")
+        except sqlite3.OperationalError:
+            return False
+        
+        # rowid = bookings.id; triggers keep the index in step with bookings
+        for statement in _SEARCH_TRIGGERS:
+            cursor.execute(statement)
+        
+        if not exists:
+            # Index bookings created before the search table existed
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS bookings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    customer_id INTEGER NOT NULL,
-                    booking_type TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    time TEXT NOT NULL,
-                    status TEXT DEFAULT 'confirmed',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
-                )
+                INSERT INTO bookings_fts (rowid, name, email, date)
+                SELECT id, name, email, date FROM bookings
             """)
-            
-            conn.commit()
-            
-        except Exception as e:
-            conn.rollback()
-            raise Exception(f"Error creating tables: {str(e)}")
-        finally:
-            conn.close()
+        
+        return True
     
     def create_booking(self, name, email, phone, booking_type, date, time, status='confirmed'):
         """Create a new booking"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        return self.create_bookings_bulk([{
+            'name': name,
+            'email': email,
+            'phone': phone,
+            'booking_type': booking_type,
+            'date': date,
+            'time': time,
+            'status': status
+        }])[0]
+    
+    def create_bookings_bulk(self, records):
+        """Create many bookings in one write transaction; returns their ids in order
         
-        try:
-            # Check if customer exists
-            cursor.execute("SELECT customer_id FROM customers WHERE email = ?", (email,))
-            customer = cursor.fetchone()
+        Each record is a dict with name, email, phone, booking_type, date, time
+        and optionally status. A customer appearing more than once keeps the
+        name and phone from their last record.
+        """
+        # Latest details per customer, in first-seen order
+        customers = {}
+        for record in records:
+            customers[record['email']] = (record['name'], record['phone'])
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
             
-            if customer:
-                customer_id = customer['customer_id']
+            try:
+                with conn:
+                    # Take the write lock up front instead of upgrading mid-transaction
+                    cursor.execute("BEGIN IMMEDIATE")
+                    
+                    customer_ids = self._save_customers(cursor, customers)
+                    
+                    # Create bookings; one prepared statement, one commit for the batch
+                    insert_sql = _SQL_INSERT_BOOKING_RETURNING if _HAS_RETURNING else _SQL_INSERT_BOOKING
+                    booking_ids = []
+                    for record in records:
+                        email = record['email']
+                        name, phone = customers[email]
+                        cursor.execute(insert_sql, (
+                            customer_ids[email],
+                            name,
+                            email,
+                            phone,
+                            record['booking_type'],
+                            record['date'],
+                            record['time'],
+                            record.get('status', 'confirmed')
+                        ))
+                        booking_ids.append(cursor.fetchone()[0] if _HAS_RETURNING else cursor.lastrowid)
                 
-                # Update customer info if needed
-                cursor.execute("""
-                    UPDATE customers 
-                    SET name = ?, phone = ?
-                    WHERE customer_id = ?
-                """, (name, phone, customer_id))
+            except Exception:
+                for email in customers:
+                    self._customer_cache.pop(email, None)
+                raise
+            
+            self._record_write()
+            for email, (name, phone) in customers.items():
+                self._remember_customer(email, customer_ids[email], name, phone)
+            return booking_ids
+    
+    def import_bookings(self, rows):
+        """Bulk-load bookings (e.g. from a CSV) in one transaction; returns how many were imported
+        
+        Rows are dicts shaped like create_bookings_bulk records and may come from
+        any iterable; they're written IMPORT_BATCH_SIZE at a time with multi-row
+        INSERTs, and no ids are returned.
+        """
+        imported = 0
+        seen = {}
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            try:
+                with conn:
+                    cursor.execute("BEGIN IMMEDIATE")
+                    
+                    batch = []
+                    for row in rows:
+                        batch.append(row)
+                        if len(batch) == IMPORT_BATCH_SIZE:
+                            imported += self._import_batch(cursor, batch, seen)
+                            batch = []
+                    if batch:
+                        # Leftover rows get their own, shorter statement
+                        imported += self._import_batch(cursor, batch, seen)
+                
+            except Exception:
+                for email in seen:
+                    self._customer_cache.pop(email, None)
+                raise
+            
+            self._record_write()
+            for email, (customer_id, name, phone) in seen.items():
+                self._remember_customer(email, customer_id, name, phone)
+            return imported
+    
+    def _import_batch(self, cursor, batch, seen):
+        """Save one batch's customers, then insert its bookings with a single statement"""
+        customers = {}
+        for row in batch:
+            customers[row['email']] = (row['name'], row['phone'])
+        
+        # Earlier batches' writes, not the pre-import cache, are what's stored now
+        customer_ids = self._save_customers(cursor, customers, seen)
+        for email, (name, phone) in customers.items():
+            seen[email] = (customer_ids[email], name, phone)
+        
+        params = []
+        for row in batch:
+            email = row['email']
+            name, phone = customers[email]
+            params += (
+                customer_ids[email],
+                name,
+                email,
+                phone,
+                row['booking_type'],
+                row['date'],
+                row['time'],
+                row.get('status', 'confirmed')
+            )
+        
+        cursor.execute(_SQL_IMPORT_BOOKINGS + ", ".join(["(?, ?, ?, ?, ?, ?, ?, ?)"] * len(batch)), params)
+        return len(batch)
+    
+    def _save_customers(self, cursor, customers, written=None):
+        """Insert or refresh customers ({email: (name, phone)}); returns {email: customer_id}
+        
+        written maps email to (customer_id, name, phone) for customers already
+        saved in the current transaction; those take precedence over the cache.
+        """
+        customer_ids = {}
+        for email, (name, phone) in customers.items():
+            # Repeat customers with unchanged details are served from the cache
+            if written and email in written:
+                customer = written[email]
             else:
-                # Create new customer
-                cursor.execute("""
-                    INSERT INTO customers (name, email, phone)
-                    VALUES (?, ?, ?)
-                """, (name, email, phone))
-                customer_id = cursor.lastrowid
+                customer = self._customer_cache.get(email)
+            if customer is not None and (name, phone) == customer[1:]:
+                customer_ids[email] = customer[0]
+            elif _HAS_RETURNING:
+                # Insert or refresh the customer and get its id in one statement
+                cursor.execute(_SQL_UPSERT_CUSTOMER, (name, email, phone))
+                row = cursor.fetchone()
+                if row is None:
+                    # Already stored with these details; the UPSERT skipped the write
+                    cursor.execute(_SQL_FIND_CUSTOMER, (email,))
+                    row = cursor.fetchone()
+                customer_ids[email] = row[0]
+            else:
+                customer_ids[email] = self._save_customer_legacy(cursor, customer, name, email, phone)
+        return customer_ids
+    
+    def _save_customer_legacy(self, cursor, customer, name, email, phone):
+        """Find-then-update-or-insert a customer, for SQLite without RETURNING"""
+        if customer is None:
+            cursor.execute(_SQL_FIND_CUSTOMER, (email,))
+            row = cursor.fetchone()
+            customer = tuple(row) if row else None
+        
+        if not customer:
+            cursor.execute(_SQL_INSERT_CUSTOMER, (name, email, phone))
+            return cursor.lastrowid
+        
+        if (name, phone) != customer[1:]:
+            cursor.execute(_SQL_UPDATE_CUSTOMER, (name, phone, customer[0]))
+        return customer[0]
+    
+    def _record_write(self):
+        """Bump write_version after a committed write (call with the writer lock held)"""
+        self.write_version += 1
+    
+    def _remember_customer(self, email, customer_id, name, phone):
+        """Record a committed customer row in the bounded email cache"""
+        self._customer_cache[email] = (customer_id, name, phone)
+        self._customer_cache.move_to_end(email)
+        if len(self._customer_cache) > CUSTOMER_CACHE_SIZE:
+            self._customer_cache.popitem(last=False)
+    
+    def get_all_bookings(self, limit=None, offset=0):
+        """Get bookings with customer information, newest first; all of them unless limit is given"""
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
             
-            # Create booking
-            cursor.execute("""
-                INSERT INTO bookings (customer_id, booking_type, date, time, status)
-                VALUES (?, ?, ?, ?, ?)
-            """, (customer_id, booking_type, date, time, status))
+            if limit is None:
+                cursor.execute(_SQL_ALL_BOOKINGS)
+            else:
+                cursor.execute(_SQL_ALL_BOOKINGS + _SQL_PAGE, (limit, offset))
             
-            booking_id = cursor.lastrowid
+            return _rows_to_dicts(cursor)
+    
+    def _build_filters(self, status=None, booking_type=None, date=None):
+        """Build a WHERE clause and its parameters from optional filters"""
+        clauses = []
+        params = []
+        
+        if status:
+            clauses.append("b.status = ?")
+            params.append(status)
+        if booking_type:
+            clauses.append("b.booking_type = ?")
+            params.append(booking_type)
+        if date:
+            clauses.append("b.date = ?")
+            params.append(date)
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+    
+    def query_bookings(self, status=None, booking_type=None, date=None, limit=None, offset=0):
+        """Get bookings matching the given filters, one page at a time"""
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
             
-            conn.commit()
-            return booking_id
+            where, params = self._build_filters(status, booking_type, date)
             
-        except Exception as e:
-            conn.rollback()
-            raise Exception(f"Error creating booking: {str(e)}")
-        finally:
-            conn.close()
+            # At most 8 filter combinations x 2, so each variant stays in the statement cache
+            sql = f"{_BOOKING_SELECT} {where} ORDER BY b.created_at DESC, b.id DESC"
+            
+            if limit is not None:
+                sql += _SQL_PAGE
+                params += [limit, offset]
+            
+            cursor.execute(sql, params)
+            
+            return _rows_to_dicts(cursor)
+    
+    def query_bookings_json(self, status=None, booking_type=None, date=None):
+        """Bookings matching the optional filters, newest first, as JSON bytes ready to download"""
+        return _json_bytes(self.query_bookings(status, booking_type, date))
+    
+    def count_bookings(self, status=None, booking_type=None, date=None):
+        """Count bookings matching the given filters"""
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            
+            where, params = self._build_filters(status, booking_type, date)
+            cursor.execute(f"SELECT COUNT(*) FROM bookings b {where}", params)
+            return cursor.fetchone()[0]
     
-    def get_all_bookings(self):
-        """Get all bookings with customer information"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    def get_distinct_values(self, column):
+        """Get the distinct values of a filterable booking column"""
+        if column not in _SQL_DISTINCT:
+            raise ValueError(f"Cannot list distinct values for column: {column}")
         
-        try:
-            cursor.execute("""
-                SELECT 
-                    b.id,
-                    c.name,
-                    c.email,
-                    c.phone,
-                    b.booking_type,
-                    b.date,
-                    b.time,
-                    b.status,
-                    b.created_at
-                FROM bookings b
-                JOIN customers c ON b.customer_id = c.customer_id
-                ORDER BY b.created_at DESC
-            """)
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
             
-            bookings = cursor.fetchall()
-            
-            # Convert to list of dictionaries
-            result = []
-            for booking in bookings:
-                result.append({
-                    'id': booking['id'],
-                    'name': booking['name'],
-                    'email': booking['email'],
-                    'phone': booking['phone'],
-                    'booking_type': booking['booking_type'],
-                    'date': booking['date'],
-                    'time': booking['time'],
-                    'status': booking['status'],
-                    'created_at': booking['created_at']
-                })
-            
-            return result
-            
-        except Exception as e:
-            raise Exception(f"Error fetching bookings: {str(e)}")
-        finally:
-            conn.close()
+            cursor.execute(_SQL_DISTINCT[column])
+            return [row[0] for row in cursor]
+    
+    def get_filter_options(self):
+        """Get the distinct status, booking_type and date values in one connection"""
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            
+            options = {}
+            for column in _SQL_DISTINCT:
+                cursor.execute(_SQL_DISTINCT[column])
+                options[column] = [row[0] for row in cursor]
+            return options
+    
+    def get_stats(self, today):
+        """Get dashboard statistics: counts, recent and upcoming bookings"""
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            
+            counts = {'status': {}, 'type': {}, 'customers': {}}
+            cursor.execute(_SQL_BOOKING_COUNTS)
+            for bucket, key, count in cursor:
+                counts[bucket][key] = count
+            by_status = counts['status']
+            by_type = counts['type']
+            unique_customers = counts['customers'][None]
+            
+            lists = {'recent': [], 'upcoming': []}
+            cursor.execute(_SQL_DASHBOARD_BOOKINGS, (today,))
+            for row in cursor:
+                lists[row['bucket']].append(row)
+            recent = [{col: row[col] for col in _RECENT_COLUMNS} for row in lists['recent']]
+            upcoming = [{col: row[col] for col in _UPCOMING_COLUMNS} for row in lists['upcoming']]
+            
+            return {
+                'total': sum(by_status.values()),
+                'by_status': by_status,
+                'by_type': by_type,
+                'unique_customers': unique_customers,
+                'recent': recent,
+                'upcoming': upcoming
+            }
     
     def get_booking_by_id(self, booking_id):
         """Get a specific booking by ID"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("""
-                SELECT 
-                    b.id,
-                    c.name,
-                    c.email,
-                    c.phone,
-                    b.booking_type,
-                    b.date,
-                    b.time,
-                    b.status,
-                    b.created_at
-                FROM bookings b
-                JOIN customers c ON b.customer_id = c.customer_id
-                WHERE b.id = ?
-            """, (booking_id,))
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_SQL_BOOKING_BY_ID, (booking_id,))
             
             booking = cursor.fetchone()
             
-            if booking:
-                return {
-                    'id': booking['id'],
-                    'name': booking['name'],
-                    'email': booking['email'],
-                    'phone': booking['phone'],
-                    'booking_type': booking['booking_type'],
-                    'date': booking['date'],
-                    'time': booking['time'],
-                    'status': booking['status'],
-                    'created_at': booking['created_at']
-                }
-            return None
-            
-        except Exception as e:
-            raise Exception(f"Error fetching booking: {str(e)}")
-        finally:
-            conn.close()
+            return dict(booking) if booking else None
     
-    def search_bookings(self, search_term):
-        """Search bookings by name, email, or date"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    def search_bookings(self, search_term, limit=None, offset=0):
+        """Search bookings by name, email, or date; all matches unless limit is given
         
-        try:
-            search_pattern = f"%{search_term}%"
+        With the FTS index, matches are word-prefix based and ordered by
+        relevance: the term's words must start consecutive words of a field
+        ("jo" finds "John Smith", "gmail" finds "ann@gmail.com", but "ohn"
+        finds nothing). Without FTS5, or for terms with no letters or digits,
+        any substring of name, email or date matches, newest first.
+        """
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT 
-                    b.id,
-                    c.name,
-                    c.email,
-                    c.phone,
-                    b.booking_type,
-                    b.date,
-                    b.time,
-                    b.status,
-                    b.created_at
-                FROM bookings b
-                JOIN customers c ON b.customer_id = c.customer_id
-                WHERE c.name LIKE ? OR c.email LIKE ? OR b.date LIKE ?
-                ORDER BY b.created_at DESC
-            """, (search_pattern, search_pattern, search_pattern))
-            
-            bookings = cursor.fetchall()
-            
-            result = []
-            for booking in bookings:
-                result.append({
-                    'id': booking['id'],
-                    'name': booking['name'],
-                    'email': booking['email'],
-                    'phone': booking['phone'],
-                    'booking_type': booking['booking_type'],
-                    'date': booking['date'],
-                    'time': booking['time'],
-                    'status': booking['status'],
-                    'created_at': booking['created_at']
-                })
-            
-            return result
-            
-        except Exception as e:
-            raise Exception(f"Error searching bookings: {str(e)}")
-        finally:
-            conn.close()
+            match = _fts_prefix_query(search_term) if self._fts else None
+            
+            if match:
+                sql = _SQL_SEARCH_FTS
+                params = {'match': match}
+            else:
+                # One named binding, referenced by all three LIKEs
+                sql = _SQL_SEARCH_LIKE
+                params = {'pattern': f"%{search_term}%"}
+            
+            if limit is not None:
+                sql += _SQL_PAGE_NAMED
+                params['limit'], params['offset'] = limit, offset
+            
+            cursor.execute(sql, params)
+            
+            return _rows_to_dicts(cursor)
     
     def update_booking_status(self, booking_id, status):
         """Update booking status"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("""
-                UPDATE bookings
-                SET status = ?
-                WHERE id = ?
-            """, (status, booking_id))
+        with self._connection() as conn:
+            cursor = conn.cursor()
             
-            conn.commit()
-            return cursor.rowcount > 0
+            with conn:
+                cursor.execute(_SQL_UPDATE_STATUS, (status, booking_id))
             
-        except Exception as e:
-            conn.rollback()
-            raise Exception(f"Error updating booking status: {str(e)}")
-        finally:
-            conn.close()
+            self._record_write()
+            return cursor.rowcount > 0
     
     def delete_booking(self, booking_id):
         """Delete a booking"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("DELETE FROM bookings WHERE id = ?", (booking_id,))
-            conn.commit()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            with conn:
+                cursor.execute(_SQL_DELETE_BOOKING, (booking_id,))
+            
+            self._record_write()
             return cursor.rowcount > 0
+    
+    def apply_bulk(self, status_updates, delete_ids=()):
+        """Apply staged status updates and deletions in one transaction"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
             
-        except Exception as e:
-            conn.rollback()
-            raise Exception(f"Error deleting booking: {str(e)}")
-        finally:
-            conn.close()
+            with conn:
+                changed = 0
+                
+                if status_updates:
+                    cursor.executemany(
+                        _SQL_UPDATE_STATUS,
+                        [(status, booking_id) for booking_id, status in status_updates.items()]
+                    )
+                    changed += cursor.rowcount
+                
+                if delete_ids:
+                    cursor.executemany(
+                        _SQL_DELETE_BOOKING,
+                        [(booking_id,) for booking_id in delete_ids]
+                    )
+                    changed += cursor.rowcount
+            
+            self._record_write()
+            return changed
     
     def get_bookings_by_date(self, date):
         """Get all bookings for a specific date"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("""
-                SELECT 
-                    b.id,
-                    c.name,
-                    c.email,
-                    c.phone,
-                    b.booking_type,
-                    b.date,
-                    b.time,
-                    b.status,
-                    b.created_at
-                FROM bookings b
-                JOIN customers c ON b.customer_id = c.customer_id
-                WHERE b.date = ?
-                ORDER BY b.time
-            """, (date,))
-            
-            bookings = cursor.fetchall()
-            
-            result = []
-            for booking in bookings:
-                result.append({
-                    'id': booking['id'],
-                    'name': booking['name'],
-                    'email': booking['email'],
-                    'phone': booking['phone'],
-                    'booking_type': booking['booking_type'],
-                    'date': booking['date'],
-                    'time': booking['time'],
-                    'status': booking['status'],
-                    'created_at': booking['created_at']
-                })
-            
-            return result
-            
-        except Exception as e:
-            raise Exception(f"Error fetching bookings by date: {str(e)}")
-        finally:
-            conn.close()
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_SQL_BOOKINGS_BY_DATE, (date,))
+            
+            return _rows_to_dicts(cursor)
     
     def get_customer_bookings(self, email):
         """Get all bookings for a specific customer"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("""
-                SELECT 
-                    b.id,
-                    c.name,
-                    c.email,
-                    c.phone,
-                    b.booking_type,
-                    b.date,
-                    b.time,
-                    b.status,
-                    b.created_at
-                FROM bookings b
-                JOIN customers c ON b.customer_id = c.customer_id
-                WHERE c.email = ?
-                ORDER BY b.date DESC, b.time DESC
-            """, (email,))
-            
-            bookings = cursor.fetchall()
-            
-            result = []
-            for booking in bookings:
-                result.append({
-                    'id': booking['id'],
-                    'name': booking['name'],
-                    'email': booking['email'],
-                    'phone': booking['phone'],
-                    'booking_type': booking['booking_type'],
-                    'date': booking['date'],
-                    'time': booking['time'],
-                    'status': booking['status'],
-                    'created_at': booking['created_at']
-                })
-            
-            return result
-            
-        except Exception as e:
-            raise Exception(f"Error fetching customer bookings: {str(e)}")
-        finally:
-            conn.close()
\ No newline at end of file
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_SQL_CUSTOMER_BOOKINGS, (email,))
+            
+            return _rows_to_dicts(cursor)